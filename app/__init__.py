@@ -48,6 +48,25 @@ def create_app(config_name=None):
     # Initialize extensions
     init_extensions(app)
     
+    # Guardar en la app la detección de staging y el BASE_URL de los emails ahora que
+    # la config está cargada, y crear el storage provider al arrancar (no en la primera
+    # petición que lo use)
+    from app.services.email_service import init_email_settings
+    from app.storage import get_storage
+    init_email_settings(app)
+    with app.app_context():
+        try:
+            get_storage()
+        except Exception as e:
+            app.logger.error(f'Error initializing storage provider: {e}', exc_info=True)
+    
+    # Serializer de tokens de confirmación de email (secret + salt leídos una sola vez)
+    from itsdangerous import URLSafeTimedSerializer
+    app.extensions['email_serializer'] = URLSafeTimedSerializer(
+        app.config['SECRET_KEY'],
+        salt=app.config.get('SECURITY_PASSWORD_SALT', 'tarracograf-salt-2024')
+    )
+    
     # Initialize Celery
     from app.celery_app import make_celery
     from app.tasks.email_tasks import init_tasks
@@ -2,9 +2,23 @@
 Celery configuration for Tarracograf
 """
 from celery import Celery
+from kombu import Queue
 from flask import Flask
 
 
+def _register_orjson_serializer():
+    """Register 'orjson' as a kombu serializer (C-based JSON, used by the email task)"""
+    import orjson
+    from kombu.serialization import register
+    register(
+        'orjson',
+        lambda obj: orjson.dumps(obj).decode('utf-8'),
+        orjson.loads,
+        content_type='application/x-orjson',
+        content_encoding='utf-8',
+    )
+
+
 def make_celery(app: Flask) -> Celery:
     """Create and configure Celery instance"""
     celery = Celery(
@@ -13,10 +27,12 @@ def make_celery(app: Flask) -> Celery:
         broker=app.config.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     )
     
+    _register_orjson_serializer()
+    
     # Update Celery config from Flask config
     celery.conf.update(
         task_serializer='json',
-        accept_content=['json'],
+        accept_content=['json', 'orjson'],
         result_serializer='json',
         timezone='Europe/Madrid',
         enable_utc=True,
@@ -27,6 +43,13 @@ def make_celery(app: Flask) -> Celery:
         worker_max_tasks_per_child=1000,
         task_always_eager=False,  # Don't execute tasks synchronously
         task_eager_propagates=True,
+        # Emails en su propia cola: una ráfaga de emails no bloquea el resto de tareas
+        # (y al revés). Declarando ambas colas, un worker sin -Q consume las dos.
+        task_queues=(Queue('celery'), Queue('email')),
+        task_default_queue='celery',
+        task_routes={'send_email_task': {'queue': 'email'}},
+        # acks_late con Redis: re-entrega si el worker muere antes de confirmar
+        broker_transport_options={'visibility_timeout': 3600},
     )
     
     class ContextTask(celery.Task):
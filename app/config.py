@@ -61,6 +61,10 @@ class Config:
     # In Railway, mount the volume at static/uploads
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    
+    # Cache-Control max-age (segundos) de /static: el navegador reutiliza CSS/JS/imágenes
+    # sin revalidar en cada visita. Las páginas HTML no se cachean (token CSRF por sesión)
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get('SEND_FILE_MAX_AGE_DEFAULT', 300))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
     # Storage configuration
@@ -101,6 +105,13 @@ class Config:
     MAIL_SUPPRESS_SEND = os.environ.get('MAIL_SUPPRESS_SEND', 'False').lower() in ('true', '1', 'yes')
     # Timeout for SMTP connection (in seconds)
     MAIL_TIMEOUT = int(os.environ.get('MAIL_TIMEOUT', '10'))
+    # Conexiones SMTP reutilizadas entre envíos (por proceso) y rotación tras N mensajes
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE', '5'))
+    MAIL_MAX_EMAILS = int(os.environ.get('MAIL_MAX_EMAILS', '100'))
+    # Segundos que una conexión del pool puede estar inactiva antes de descartarla
+    MAIL_POOL_IDLE_TIMEOUT = int(os.environ.get('MAIL_POOL_IDLE_TIMEOUT', '60'))
+    # Máximo de destinatarios por tarea Celery de email (listas grandes se reparten)
+    MAIL_RECIPIENT_CHUNK_SIZE = int(os.environ.get('MAIL_RECIPIENT_CHUNK_SIZE', '20'))
     
     # Admin email for notifications
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'hola@tarracograf.cat')
@@ -133,6 +144,22 @@ class Config:
         # Use explicit CELERY_BROKER_URL/CELERY_RESULT_BACKEND or default
         CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
         CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+    # Cache configuration (Flask-Caching)
+    # Use Redis database 2 if available (0 = Celery, 1 = Flask-Limiter), otherwise in-process cache
+    if redis_url:
+        CACHE_TYPE = 'RedisCache'
+        CACHE_REDIS_URL = f"{redis_url}/2"
+    else:
+        CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', '300'))
+    # Lista pública de items del mapa: invalidate_public_items_cache() solo llega a
+    # todos los workers con un backend compartido (Redis). Con la caché en proceso
+    # (SimpleCache) cada worker de gunicorn tiene su copia, así que se usa un timeout
+    # corto para acotar cuánto tiempo puede servir datos obsoletos
+    PUBLIC_ITEMS_CACHE_TIMEOUT = int(os.environ.get(
+        'PUBLIC_ITEMS_CACHE_TIMEOUT', '300' if redis_url else '15'
+    ))
+    CACHE_KEY_PREFIX = 'tarracograf:'
     # Use Celery for async email sending (default: True)
     MAIL_USE_SSL=True
 
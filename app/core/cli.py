@@ -57,7 +57,8 @@ def register_cli_commands(app):
                     ),
                     :buffer_dist
                   )
-                )
+                ),
+                updated_at = NOW()
             """)
             try:
                 result = db.session.execute(sql, {'snap': snap, 'buffer_dist': buffer_dist})
@@ -171,7 +172,8 @@ def register_cli_commands(app):
                         ST_MakeValid(ST_GeomFromText(s.polygon, 4326)),
                         :buffer
                     )
-                )
+                ),
+                updated_at = NOW()
                 WHERE s.id IN (SELECT section_id FROM sections_with_gaps)
             """)
             
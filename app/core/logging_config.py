@@ -2,13 +2,20 @@
 Logging configuration for the application
 """
 import os
+import atexit
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import re
 
 
 def setup_logging(app):
     """Configure logging for the application"""
+    # app.logger is shared by every app with the same name (create_app() called again
+    # in scripts/tests): if it's already configured, don't add the handlers twice
+    if _has_queue_handler(app.logger):
+        return
+    
     # Create logs directory if it doesn't exist
     if not os.path.exists('logs'):
         os.mkdir('logs')
@@ -44,11 +51,65 @@ def setup_logging(app):
         if not os.environ.get('FLASK_SILENT_STARTUP'):
             app.logger.info('Tarracograf startup (DEBUG mode)')
     
+    # Handler I/O (file, stderr) off the request/upload threads
+    _install_queue_handler(app)
+    
     # Log configuration on startup (only if not silenced)
     if not os.environ.get('FLASK_SILENT_STARTUP'):
         _log_startup_configuration(app)
 
 
+# QueueHandler -> QueueListener activos en este proceso. Los hooks de fork y de salida
+# se registran una sola vez (abajo) y recorren este registro
+_queue_listeners = {}
+
+
+def _start_listener(queue_handler, handlers):
+    # Cola nueva + listener nuevo: tras un fork (Celery prefork, gunicorn) el hilo
+    # del listener del proceso padre no existe en el hijo
+    queue_handler.queue = queue.SimpleQueue()
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _queue_listeners[queue_handler] = listener
+
+
+def _restart_listeners_after_fork():
+    for queue_handler, listener in list(_queue_listeners.items()):
+        _start_listener(queue_handler, listener.handlers)
+
+
+def _stop_listeners():
+    """Flush pending records on exit"""
+    for listener in list(_queue_listeners.values()):
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+
+os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+atexit.register(_stop_listeners)
+
+
+def _has_queue_handler(logger):
+    return any(isinstance(handler, QueueHandler) for handler in logger.handlers)
+
+
+def _install_queue_handler(app):
+    """Replace app.logger handlers by a QueueHandler; a QueueListener thread runs the
+    real handlers. Threads only enqueue records instead of taking the handlers' I/O lock"""
+    if _has_queue_handler(app.logger):
+        return
+    handlers = list(app.logger.handlers)
+    if not handlers:
+        return
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    _start_listener(queue_handler, handlers)
+    for handler in handlers:
+        app.logger.removeHandler(handler)
+    app.logger.addHandler(queue_handler)
+
+
 def _log_startup_configuration(app):
     """Log application configuration on startup"""
     app.logger.info(f"Environment: {app.config['ENV']}")
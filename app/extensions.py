@@ -7,6 +7,7 @@ from flask_mail import Mail
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_share import Share
+from flask_caching import Cache
 
 # Initialize extensions (will be initialized in app factory)
 db = SQLAlchemy()
@@ -16,6 +17,7 @@ babel = Babel()
 security = Security()
 mail = Mail()
 share = Share()
+cache = Cache()
 # Limiter will be initialized in init_extensions with app context
 limiter = None
 
@@ -57,6 +59,10 @@ def init_extensions(app):
     # Initialize Flask-Share for social media sharing
     share.init_app(app)
     
+    # Initialize Flask-Caching (Redis if available, in-process otherwise)
+    cache.init_app(app)
+    app.logger.info(f'Flask-Caching initialized with {app.config.get("CACHE_TYPE")}')
+    
     # Initialize Dependency Injection Container
     from app.container import get_container
     from app.providers.base import EmailProvider
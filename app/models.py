@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from flask_security import UserMixin, RoleMixin
 from flask_babel import _
+from sqlalchemy import func
 from app.extensions import db
 
 # Import GeoAlchemy2 for PostGIS support
@@ -32,7 +33,8 @@ inventory_item_categories = db.Table('inventory_item_categories',
     db.Column('item_id', db.Integer(), db.ForeignKey('inventory_item.id'), primary_key=True),
     db.Column('category_id', db.Integer(), db.ForeignKey('inventory_category.id'), primary_key=True),
     db.Column('is_primary', db.Boolean(), default=False, nullable=False),
-    db.Column('created_at', db.DateTime(), default=datetime.utcnow, nullable=False)
+    db.Column('created_at', db.DateTime(), default=datetime.utcnow, nullable=False),
+    db.Index('ix_inventory_item_categories_category_item', 'category_id', 'item_id')
 )
 
 # ========== Enums para Estados ==========
@@ -75,8 +77,8 @@ class InventoryItemStatus(str, Enum):
     
     @classmethod
     def visible_statuses(cls):
-        """Estados visibles en el mapa público"""
-        return [cls.APPROVED.value]
+        """Estados visibles en el mapa público (tupla constante, no se reconstruye por llamada)"""
+        return _INVENTORY_VISIBLE_STATUSES
     
     @classmethod
     def can_be_approved_from(cls):
@@ -88,6 +90,8 @@ class InventoryItemStatus(str, Enum):
         """Estados desde los que se puede resolver"""
         return [cls.APPROVED.value]
 
+_INVENTORY_VISIBLE_STATUSES = (InventoryItemStatus.APPROVED.value,)
+
 class InitiativeStatus(str, Enum):
     """Estados posibles para iniciativas"""
     PENDING = 'pending'
@@ -164,9 +168,11 @@ class User(db.Model, UserMixin):
     
     def is_section_responsible(self, section_id=None):
         """Verificar si el usuario es responsable de alguna sección o de una específica"""
-        if not section_id:
-            return SectionResponsible.query.filter_by(user_id=self.id).first() is not None
-        return SectionResponsible.query.filter_by(user_id=self.id, section_id=section_id).first() is not None
+        # EXISTS: la BD se detiene en la primera fila, sin hidratar objetos
+        query = SectionResponsible.query.filter_by(user_id=self.id)
+        if section_id:
+            query = query.filter_by(section_id=section_id)
+        return db.session.query(query.exists()).scalar()
     
     def get_managed_sections(self):
         """Obtener todas las secciones que gestiona el usuario"""
@@ -343,6 +349,9 @@ class SectionResponsible(db.Model):
     def __repr__(self):
         return f'<SectionResponsible user={self.user_id} section={self.section_id}>'
 
+# Caché en proceso del boundary preparado para point_is_inside: ((id, updated_at), geometría)
+_prepared_boundary_cache = (None, None)
+
 class CityBoundary(db.Model):
     """Boundary externo de Tarragona (unión de todas las secciones)"""
     __tablename__ = 'city_boundary'
@@ -437,69 +446,68 @@ class CityBoundary(db.Model):
         return boundary
     
     @staticmethod
-    def point_is_inside(lat, lng):
-        """Verificar si un punto está dentro del boundary de Tarragona"""
-        boundary = CityBoundary.get_or_create_boundary()
+    def get_prepared_boundary():
+        """Obtener la geometría Shapely preparada del boundary.
+        
+        Se cachea en proceso indexada por (id, updated_at): una consulta mínima
+        basta para detectar si el boundary se ha recalculado, en lugar de enviar
+        el WKT completo a PostGIS en cada comprobación. Retorna None si no hay
+        boundary o no se puede parsear.
+        """
+        global _prepared_boundary_cache
+        from shapely import wkt
+        from shapely.prepared import prep
+        from shapely.validation import make_valid
         
+        version = db.session.query(CityBoundary.id, CityBoundary.updated_at).first()
+        if version is None:
+            # Calcular y guardar el boundary si aún no existe
+            boundary = CityBoundary.get_or_create_boundary()
+            if not boundary:
+                return None
+            version = (boundary.id, boundary.updated_at)
+        version = tuple(version)
+        
+        cached_version, prepared = _prepared_boundary_cache
+        if prepared is not None and cached_version == version:
+            return prepared
+        
+        boundary = db.session.get(CityBoundary, version[0])
         if not boundary or not boundary.polygon:
-            # Si no hay boundary, usar validación básica por bounding box
-            import logging
-            logging.getLogger(__name__).warning(f"City boundary not found, using bounding box validation for point ({lat}, {lng})")
-            return 40.5 <= lat <= 41.5 and 0.5 <= lng <= 2.0
+            return None
+        
+        # Equivalente a ST_MakeValid: corregir la topología una sola vez al cargar
+        geom = wkt.loads(boundary.polygon)
+        if not geom.is_valid:
+            geom = make_valid(geom)
+        prepared = prep(geom)
+        _prepared_boundary_cache = (version, prepared)
+        return prepared
+    
+    @staticmethod
+    def point_is_inside(lat, lng):
+        """Verificar si un punto está dentro del boundary de Tarragona"""
+        import logging
+        logger = logging.getLogger(__name__)
         
         try:
-            from sqlalchemy import func
-            from app.extensions import db
-            
-            # Usar PostGIS ST_Contains (funciona con Polygon y MultiPolygon)
-            # Primero validar el boundary con ST_MakeValid por si acaso
-            point = func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326)
-            boundary_geom = func.ST_MakeValid(
-                func.ST_GeomFromText(boundary.polygon, 4326)
-            )
-            
-            result = db.session.query(
-                func.ST_Contains(
-                    boundary_geom,
-                    point
-                ).label('inside')
-            ).first()
+            from shapely.geometry import Point
             
-            if result is not None:
-                is_inside = bool(result.inside)
-                import logging
-                logging.getLogger(__name__).debug(
-                    f"PostGIS validation: point ({lat}, {lng}) is {'INSIDE' if is_inside else 'OUTSIDE'} boundary"
-                )
-                return is_inside
+            prepared = CityBoundary.get_prepared_boundary()
+            if prepared is None:
+                # Si no hay boundary, usar validación básica por bounding box
+                logger.warning(f"City boundary not found, using bounding box validation for point ({lat}, {lng})")
+                return 40.5 <= lat <= 41.5 and 0.5 <= lng <= 2.0
             
-            # Fallback: usar Shapely si PostGIS falla
-            try:
-                from shapely import wkt
-                from shapely.geometry import Point
-                
-                geom = wkt.loads(boundary.polygon)
-                point = Point(lng, lat)
-                is_inside = geom.contains(point)
-                import logging
-                logging.getLogger(__name__).debug(
-                    f"Shapely validation: point ({lat}, {lng}) is {'INSIDE' if is_inside else 'OUTSIDE'} boundary"
-                )
-                return is_inside
-            except Exception as e:
-                import logging
-                logging.getLogger(__name__).warning(f"Shapely point check failed: {e}")
-            
-            # Último fallback: bounding box básico
-            import logging
-            logging.getLogger(__name__).warning(
-                f"Using bounding box fallback validation for point ({lat}, {lng})"
+            # Geometría preparada (Polygon o MultiPolygon): contains en memoria
+            is_inside = prepared.contains(Point(lng, lat))
+            logger.debug(
+                f"Shapely validation: point ({lat}, {lng}) is {'INSIDE' if is_inside else 'OUTSIDE'} boundary"
             )
-            return 40.5 <= lat <= 41.5 and 0.5 <= lng <= 2.0
+            return is_inside
             
         except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Error checking point inside boundary: {e}", exc_info=True)
+            logger.error(f"Error checking point inside boundary: {e}", exc_info=True)
             # Fallback a validación básica
             return 40.5 <= lat <= 41.5 and 0.5 <= lng <= 2.0
     
@@ -569,13 +577,14 @@ class InventoryItem(db.Model):
     image_gps_latitude = db.Column(db.Float, nullable=True)  # GPS lat from image EXIF
     image_gps_longitude = db.Column(db.Float, nullable=True)  # GPS lng from image EXIF
     location_source = db.Column(db.String(50), nullable=True)  # 'image_gps', 'browser_geolocation', 'manual', 'form_coordinates'
+    # Enum nativo de PostgreSQL: comparaciones de 4 bytes en lugar de varchar
     status = db.Column(
-        db.String(20), 
+        db.Enum(*InventoryItemStatus.all(), name='inv_status'),
         default=InventoryItemStatus.PENDING.value,
         nullable=False
     )
-    importance_count = db.Column(db.Integer, default=0)  # Contador de importancia/votos
-    resolved_count = db.Column(db.Integer, default=0)  # Contador de "ya no está"
+    importance_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Contador de importancia/votos
+    resolved_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Contador de "ya no está"
     share_count = db.Column(db.Integer, default=0)  # Contador de comparticiones
     created_at = db.Column(db.DateTime(), default=datetime.utcnow)
     updated_at = db.Column(db.DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -595,6 +604,13 @@ class InventoryItem(db.Model):
     voters = db.relationship('InventoryVote', backref='item', lazy='dynamic', cascade='all, delete-orphan')
     resolved_by = db.relationship('InventoryResolved', backref='item', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Listados: WHERE status IN (...) ORDER BY created_at DESC, y parcial solo con los visibles
+    __table_args__ = (
+        db.Index('ix_inventory_status_created', 'status', created_at.desc()),
+        db.Index('ix_inventory_visible_created', created_at.desc(),
+                 postgresql_where=db.text("status = 'approved'")),
+    )
+    
     @property
     def full_category(self):
         """Return full category path: category->subcategory"""
@@ -610,13 +626,13 @@ class InventoryItem(db.Model):
         """Check if a user has already voted for this item"""
         if not user_id:
             return False
-        return self.voters.filter_by(user_id=user_id).first() is not None
+        return db.session.query(self.voters.filter_by(user_id=user_id).exists()).scalar()
     
     def has_user_resolved(self, user_id):
         """Check if a user has already reported this item as resolved"""
         if not user_id:
             return False
-        return self.resolved_by.filter_by(user_id=user_id).first() is not None
+        return db.session.query(self.resolved_by.filter_by(user_id=user_id).exists()).scalar()
     
     def assign_section(self):
         """Asignar automáticamente la sección basándose en las coordenadas"""
@@ -752,21 +768,25 @@ class InventoryItem(db.Model):
         Retorna (success: bool, auto_resolved: bool, message: str)"""
         from app.models import InventoryResolved
         from flask import current_app
-        
-        if self.has_user_resolved(user_id):
-            return False, False, _('Ya has reportado que este item ya no está')
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
         
         if self.is_resolved():
             return False, False, _('Este item ya está marcado como resuelto')
         
-        # Crear reporte de resuelto
-        resolved = InventoryResolved(item_id=self.id, user_id=user_id)
-        db.session.add(resolved)
+        # Crear reporte de resuelto: ON CONFLICT DO NOTHING sobre UNIQUE (item_id, user_id);
+        # rowcount == 0 significa que el usuario ya lo había reportado
+        result = db.session.execute(
+            pg_insert(InventoryResolved)
+            .values(item_id=self.id, user_id=user_id)
+            .on_conflict_do_nothing(constraint='unique_item_user_resolved')
+        )
+        if result.rowcount == 0:
+            return False, False, _('Ya has reportado que este item ya no está')
         
-        # Incrementar contador
-        if self.resolved_count is None:
-            self.resolved_count = 0
-        self.resolved_count += 1
+        # Incrementar contador en SQL (COALESCE cubre filas antiguas con NULL);
+        # tras el flush el atributo se recarga ya con el valor actualizado
+        self.resolved_count = func.coalesce(InventoryItem.resolved_count, 0) + 1
+        db.session.flush()
         
         # Auto-resolver si alcanza el threshold
         auto_resolved = False
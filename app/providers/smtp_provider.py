@@ -5,10 +5,96 @@ Used for local development with Gmail SMTP
 from app.providers.base import EmailProvider
 from flask import current_app
 from flask_mail import Message
+import functools
+import os
+import smtplib
 import threading
+import time
 import queue as queue_module
 
 
+# Pool de conexiones SMTP abiertas (flask_mail.Connection) compartido por el proceso:
+# evita el handshake TCP + SSL/STARTTLS + LOGIN en cada email. Flask-Mail rota la
+# conexión sola al llegar a MAIL_MAX_EMAILS mensajes
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+
+def _get_smtp_pool(size):
+    global _smtp_pool
+    if _smtp_pool is None:
+        with _smtp_pool_lock:
+            if _smtp_pool is None:
+                _smtp_pool = queue_module.Queue(maxsize=max(size, 1))
+    return _smtp_pool
+
+
+def _close_smtp_connection(conn):
+    try:
+        conn.__exit__(None, None, None)
+    except Exception:
+        pass
+
+
+def _get_pooled_connection(mail, pool, idle_timeout):
+    """(conn, reused): a pooled connection used within idle_timeout seconds, or a new one.
+    Connections idle for longer are closed without trying them (the server has most
+    likely dropped them), which saves a failed send + reconnect"""
+    now = time.monotonic()
+    while True:
+        try:
+            conn, last_used = pool.get_nowait()
+        except queue_module.Empty:
+            return mail.connect().__enter__(), False
+        if now - last_used <= idle_timeout:
+            return conn, True
+        _close_smtp_connection(conn)
+
+
+def _send_with_pooled_connection(mail, msg, pool_size, idle_timeout=60):
+    """Send msg over a pooled SMTP connection. A stale pooled connection (closed
+    by the server while idle) is discarded and the send retried once on a new one"""
+    pool = _get_smtp_pool(pool_size)
+    conn, reused = _get_pooled_connection(mail, pool, idle_timeout)
+    
+    try:
+        conn.send(msg)
+    except smtplib.SMTPServerDisconnected:
+        _close_smtp_connection(conn)
+        if not reused:
+            raise
+        conn = mail.connect().__enter__()
+        try:
+            conn.send(msg)
+        except Exception:
+            _close_smtp_connection(conn)
+            raise
+    except Exception:
+        _close_smtp_connection(conn)
+        raise
+    
+    try:
+        pool.put_nowait((conn, time.monotonic()))
+    except queue_module.Full:
+        _close_smtp_connection(conn)
+
+
+@functools.lru_cache(maxsize=4)
+def _default_sender(app):
+    """MAIL_DEFAULT_SENDER, read once per app (config doesn't change after startup)"""
+    return app.config.get('MAIL_DEFAULT_SENDER', 'Tarracograf <hola@tarracograf.cat>')
+
+
+@functools.lru_cache(maxsize=4)
+def _logo_data(static_folder):
+    """Bytes of the inline logo, read from disk once per process (None if missing)"""
+    logo_path = os.path.join(static_folder, 'images', 'tarracograf_blanc1.png')
+    if not os.path.exists(logo_path):
+        return None
+    with open(logo_path, 'rb') as f:
+        return f.read()
+
+
 class SMTPEmailProvider(EmailProvider):
     """Provider using SMTP (Flask-Mail) - for local development"""
     
@@ -40,13 +126,11 @@ class SMTPEmailProvider(EmailProvider):
         
         try:
             from app.extensions import mail
-            import os
             
             # Get sender from config or parameter
-            default_sender = current_app.config.get('MAIL_DEFAULT_SENDER', 'Tarracograf <hola@tarracograf.cat>')
-            email_sender = sender or default_sender
+            email_sender = sender or _default_sender(current_app._get_current_object())
             
-            current_app.logger.info(f'[EMAIL DEBUG] Creating SMTP message for {to}...')
+            current_app.logger.debug('[EMAIL DEBUG] Creating SMTP message for %s...', to)
             msg = Message(
                 subject=subject,
                 recipients=[to] if isinstance(to, str) else to,
@@ -57,10 +141,8 @@ class SMTPEmailProvider(EmailProvider):
             
             # Attach logo as inline image with Content-ID
             try:
-                logo_path = os.path.join(current_app.static_folder or 'static', 'images', 'tarracograf_blanc1.png')
-                if os.path.exists(logo_path):
-                    with open(logo_path, 'rb') as f:
-                        logo_data = f.read()
+                logo_data = _logo_data(current_app.static_folder or 'static')
+                if logo_data:
                     msg.attach(
                         'tarracograf_logo.png',
                         'image/png',
@@ -72,10 +154,12 @@ class SMTPEmailProvider(EmailProvider):
             except Exception as e:
                 current_app.logger.warning(f'Could not attach logo to email: {e}')
             
-            current_app.logger.info(f'[EMAIL DEBUG] Sending email via SMTP to {to}...')
+            current_app.logger.debug('[EMAIL DEBUG] Sending email via SMTP to %s...', to)
             
             # Get app instance for thread context
             app_instance = current_app._get_current_object()
+            pool_size = current_app.config.get('MAIL_POOL_SIZE', 5)
+            idle_timeout = current_app.config.get('MAIL_POOL_IDLE_TIMEOUT', 60)
             
             # Send email with timeout using threading
             result_queue = queue_module.Queue()
@@ -85,7 +169,9 @@ class SMTPEmailProvider(EmailProvider):
                 # Push application context for the thread
                 with app_instance.app_context():
                     try:
-                        mail.send(msg)
+                        # The connection only goes back to the pool once this thread finishes,
+                        # so a timed-out send never hands a busy connection to another email
+                        _send_with_pooled_connection(mail, msg, pool_size, idle_timeout)
                         result_queue.put(True)
                     except Exception as e:
                         error_queue.put(e)
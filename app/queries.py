@@ -0,0 +1,38 @@
+"""
+Piezas de consulta compartidas entre blueprints (inventario, home, analytics)
+"""
+from sqlalchemy import func, case, exists
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.models import InventoryItem, InventoryCategory, inventory_item_categories
+
+# Desbordamientos de contenedores (ahora gestionados por Container Points): subcategorías
+# de 'contenidors' excluidas de mapa, home y estadísticas. Expresión construida una sola vez
+# sobre las tablas (NOT EXISTS correlacionado), sin consultar antes los ids de categoría
+OVERFLOW_SUBCATEGORY_CODES = ('escombreries_desbordades', 'basura_desbordada', 'deixadesa')
+_overflow_parent = aliased(InventoryCategory)
+EXCLUDE_CONTAINER_OVERFLOW_ITEMS = ~exists().where(
+    inventory_item_categories.c.item_id == InventoryItem.id,
+    inventory_item_categories.c.category_id == InventoryCategory.id,
+    InventoryCategory.code.in_(OVERFLOW_SUBCATEGORY_CODES),
+    InventoryCategory.parent_id == _overflow_parent.id,
+    _overflow_parent.code == 'contenidors',
+    _overflow_parent.parent_id.is_(None)
+).correlate(InventoryItem)
+
+
+def item_category_codes_subquery():
+    """Subconsulta (item_id, main_code, sub_code) con la categoría principal y la
+    subcategoría de cada item, para agregar estadísticas directamente en SQL"""
+    return db.session.query(
+        inventory_item_categories.c.item_id.label('item_id'),
+        func.min(case(
+            (InventoryCategory.parent_id.is_(None), InventoryCategory.code)
+        )).label('main_code'),
+        func.min(case(
+            (InventoryCategory.parent_id.isnot(None), InventoryCategory.code)
+        )).label('sub_code'),
+    ).join(
+        InventoryCategory, InventoryCategory.id == inventory_item_categories.c.category_id
+    ).group_by(inventory_item_categories.c.item_id).subquery()
@@ -1,13 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_security import login_required, current_user
 from flask_security.decorators import roles_required
-from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 from app.models import Initiative, User, user_initiatives, InventoryItem, Donation, Section, SectionResponsible, Role, District, ContainerPointSuggestion, RoleEnum, InventoryCategory
 from app.extensions import db
 from app.forms import InitiativeForm
-from app.utils import sanitize_html, allowed_file, optimize_image
+from app.utils import sanitize_html, allowed_file, optimize_image, unique_upload_filename
 # Config.UPLOAD_FOLDER removed - using current_app.config['UPLOAD_FOLDER'] instead
 from flask_babel import gettext as _
 
@@ -111,7 +110,7 @@ def new_initiative():
         if form.image.data:
             file = form.image.data
             if file and allowed_file(file.filename):
-                filename = secure_filename(f"{datetime.now().timestamp()}_{file.filename}")
+                filename = unique_upload_filename(file.filename)
                 file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
                 file.save(file_path)
                 
@@ -187,7 +186,7 @@ def edit_initiative(id):
                         os.remove(old_path)
                     # TODO: Delete from storage if using remote storage (Bunny)
                 
-                filename = secure_filename(f"{datetime.now().timestamp()}_{file.filename}")
+                filename = unique_upload_filename(file.filename)
                 file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
                 file.save(file_path)
                 
@@ -475,6 +474,9 @@ def approve_item(id):
     
     db.session.commit()
     
+    from app.routes.inventory import invalidate_public_items_cache
+    invalidate_public_items_cache()
+    
     # Send approval email if reporter exists
     if item.reporter:
         try:
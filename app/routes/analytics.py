@@ -25,6 +25,7 @@ from app.models import (
     InventoryCategory,
 )
 from app.extensions import db
+from app.queries import EXCLUDE_CONTAINER_OVERFLOW_ITEMS
 from sqlalchemy import func, and_, or_
 
 bp = Blueprint('analytics', __name__, url_prefix='/admin/analytics')
@@ -36,21 +37,7 @@ def _exclude_container_overflow_items(query):
     from inventory item queries, as these are now handled by Container Points.
     Updated to use many-to-many relationship with InventoryCategory.
     """
-    # Buscar categorías de overflow
-    contenidors_cat = InventoryCategory.query.filter_by(code='contenidors', parent_id=None).first()
-    overflow_subcats = InventoryCategory.query.filter(
-        InventoryCategory.parent_id == contenidors_cat.id if contenidors_cat else None,
-        InventoryCategory.code.in_(['escombreries_desbordades', 'basura_desbordada', 'deixadesa'])
-    ).all() if contenidors_cat else []
-    
-    # Excluir items con categorías de overflow
-    if overflow_subcats:
-        overflow_category_ids = [cat.id for cat in overflow_subcats]
-        query = query.filter(
-            ~InventoryItem.categories.any(InventoryCategory.id.in_(overflow_category_ids))
-        )
-    
-    return query
+    return query.filter(EXCLUDE_CONTAINER_OVERFLOW_ITEMS)
 
 @bp_public.route('/')
 def public_reports():
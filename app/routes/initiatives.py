@@ -3,7 +3,7 @@ from flask_security import login_required, current_user
 from flask_babel import gettext as _
 from app.models import Initiative, Comment
 from app.extensions import db
-from app.utils import sanitize_html, get_category_name
+from app.utils import sanitize_html, get_category_name, unique_upload_filename
 from app.forms import InitiativeForm
 from datetime import datetime
 
@@ -67,7 +67,6 @@ def create_initiative():
     """Permitir a usuarios crear iniciativas (requiere aprobación)"""
     from flask import current_app
     from app.utils import allowed_file, optimize_image
-    from werkzeug.utils import secure_filename
     import os
     
     form = InitiativeForm()
@@ -99,7 +98,7 @@ def create_initiative():
         if form.image.data:
             file = form.image.data
             if file and allowed_file(file.filename):
-                filename = secure_filename(f"{datetime.now().timestamp()}_{file.filename}")
+                filename = unique_upload_filename(file.filename)
                 file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
                 file.save(file_path)
                 
@@ -2,9 +2,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_security import login_required, current_user
 from flask_security.decorators import roles_required
 from flask_babel import gettext as _
-from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
+import orjson
 from app.models import (
     InventoryItem,
     InventoryVote,
@@ -19,15 +19,18 @@ from app.models import (
     ContainerPointSuggestion,
     RoleEnum,
     InventoryCategory,
-    inventory_item_categories,
 )
-from app.extensions import db, csrf
-from sqlalchemy import not_, or_
+from app.queries import EXCLUDE_CONTAINER_OVERFLOW_ITEMS, item_category_codes_subquery
+from app.extensions import db, csrf, cache
+from sqlalchemy import not_, or_, func, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload, joinedload, raiseload
 from app.forms import InventoryForm
 from app.utils import (
     sanitize_html,
     allowed_file,
     optimize_image,
+    unique_upload_filename,
     extract_gps_from_image,
     calculate_distance_km,
     get_inventory_category_name,
@@ -39,12 +42,39 @@ from app.utils import (
     get_image_path,
     get_image_url,
     get_inventory_emoji,
+    get_locale,
 )
 from app.core.decorators import section_responsible_required
 # Config.UPLOAD_FOLDER removed - using current_app.config['UPLOAD_FOLDER'] instead
 
 bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 
+def _json_response(data, status=200):
+    """Respuesta JSON serializada con orjson (más rápido que jsonify en listas grandes;
+    serializa datetime de forma nativa en ISO 8601)"""
+    return current_app.response_class(
+        orjson.dumps(data),
+        status=status,
+        mimetype='application/json'
+    )
+
+def _browser_navigation():
+    """True si la petición viene de navegar directamente (text/html como tipo preferido).
+    Usa el Accept ya parseado por Werkzeug; fetch() envía */* y no se ve afectado"""
+    return request.accept_mimetypes.best == 'text/html'
+
+def _item_category_codes(item):
+    """Códigos (categoría principal, subcategoría) de un item, o None si no tiene"""
+    main_code = None
+    sub_code = None
+    for cat in item.categories:
+        if cat.parent_id is None:
+            if main_code is None:
+                main_code = cat.code
+        elif sub_code is None:
+            sub_code = cat.code
+    return main_code, sub_code
+
 def _get_subcategories_by_parent():
     """Función auxiliar para obtener subcategorías agrupadas por categoría padre"""
     try:
@@ -81,100 +111,43 @@ def inventory_map():
     category = normalize_category_from_url(category_url)
     subcategory = normalize_subcategory_from_url(subcategory_url)
     
-    # Build query - only show approved items (visible in map)
-    # Exclude container overflow items - now handled by Container Points
-    # Buscar items que NO tengan la categoría 'contenidors' con subcategorías de overflow
-    contenidors_cat = InventoryCategory.query.filter_by(code='contenidors', parent_id=None).first()
-    overflow_subcats = InventoryCategory.query.filter(
-        InventoryCategory.parent_id == contenidors_cat.id if contenidors_cat else None,
-        InventoryCategory.code.in_(['escombreries_desbordades', 'basura_desbordada', 'deixadesa'])
-    ).all() if contenidors_cat else []
-    
-    query = InventoryItem.query.filter(
-        InventoryItem.status.in_(InventoryItemStatus.visible_statuses())
-    )
-    
-    # Excluir items con categorías de overflow
-    if overflow_subcats:
-        overflow_category_ids = [cat.id for cat in overflow_subcats]
-        query = query.filter(
-            ~InventoryItem.categories.any(InventoryCategory.id.in_(overflow_category_ids))
-        )
-    
-    if category:
-        # Filtrar por categoría usando la relación many-to-many
-        category_obj = InventoryCategory.query.filter_by(code=category, parent_id=None).first()
-        if category_obj:
-            query = query.filter(InventoryItem.categories.any(InventoryCategory.id == category_obj.id))
-    
-    if subcategory:
-        # Filtrar por subcategoría usando la relación many-to-many
-        subcategory_obj = InventoryCategory.query.filter(
-            InventoryCategory.code == subcategory,
-            InventoryCategory.parent_id.isnot(None)
-        ).first()
-        if subcategory_obj:
-            query = query.filter(InventoryItem.categories.any(InventoryCategory.id == subcategory_obj.id))
-    
-    items = query.order_by(InventoryItem.created_at.desc()).all()
+    # Los marcadores del mapa se cargan vía /api/items (cacheado): la plantilla
+    # no itera los items, así que no se materializan aquí
     
     # Get statistics - only count approved items
     # Exclude container overflow items - now handled by Container Points
     stats_query = InventoryItem.query.filter(
-        InventoryItem.status.in_(InventoryItemStatus.visible_statuses())
+        InventoryItem.status.in_(InventoryItemStatus.visible_statuses()),
+        EXCLUDE_CONTAINER_OVERFLOW_ITEMS
     )
-    if overflow_subcats:
-        overflow_category_ids = [cat.id for cat in overflow_subcats]
-        stats_query = stats_query.filter(
-            ~InventoryItem.categories.any(InventoryCategory.id.in_(overflow_category_ids))
-        )
     
-    total_items = stats_query.count()
-    
-    # Statistics by category - usar relación many-to-many
+    # Statistics by category - una sola agregación GROUP BY (categoría, subcategoría)
+    # en lugar de materializar todos los items en Python
+    item_cats = item_category_codes_subquery()
+    stats_rows = stats_query.with_entities(
+        item_cats.c.main_code,
+        item_cats.c.sub_code,
+        func.count(InventoryItem.id).label('n')
+    ).select_from(InventoryItem).outerjoin(
+        item_cats, item_cats.c.item_id == InventoryItem.id
+    ).group_by(item_cats.c.main_code, item_cats.c.sub_code).all()
+    
+    total_items = 0
     by_category = {}
-    for item in stats_query.all():
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        sub_cats = [cat for cat in item.categories if cat.parent_id is not None]
-        
-        if main_cats and sub_cats:
-            cat_key = f"{main_cats[0].code}->{sub_cats[0].code}"
-        elif main_cats:
-            cat_key = main_cats[0].code
-        else:
-            continue  # Skip items sin categorías
-        
-        by_category[cat_key] = by_category.get(cat_key, 0) + 1
-    
-    # Ensure all items have importance_count set (fix for existing items)
-    # This handles items created before the importance_count field was added
-    items_without_count = stats_query.all()
-    fixed = False
-    for item in items_without_count:
-        if item.importance_count is None:
-            item.importance_count = 0
-            fixed = True
-    if fixed:
-        db.session.commit()
-    
-    # Group statistics by main category and subcategory - usar relación many-to-many
     by_main_category = {}
     by_subcategory = {}
-    
-    for item in stats_query.all():
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        sub_cats = [cat for cat in item.categories if cat.parent_id is not None]
+    for main_cat_code, sub_cat_code, n in stats_rows:
+        total_items += n
+        if not main_cat_code:
+            continue  # Skip items sin categorías
         
-        if main_cats:
-            main_cat_code = main_cats[0].code
-            by_main_category[main_cat_code] = by_main_category.get(main_cat_code, 0) + 1
-            
-            # Count by subcategory (only if category is selected and matches)
-            if category and main_cat_code == category and sub_cats:
-                sub_cat_code = sub_cats[0].code
-                by_subcategory[sub_cat_code] = by_subcategory.get(sub_cat_code, 0) + 1
+        cat_key = f"{main_cat_code}->{sub_cat_code}" if sub_cat_code else main_cat_code
+        by_category[cat_key] = by_category.get(cat_key, 0) + n
+        by_main_category[main_cat_code] = by_main_category.get(main_cat_code, 0) + n
+        
+        # Count by subcategory (only if category is selected and matches)
+        if category and main_cat_code == category and sub_cat_code:
+            by_subcategory[sub_cat_code] = by_subcategory.get(sub_cat_code, 0) + n
     
     # Cargar categorías desde BD para los filtros del frontend
     try:
@@ -203,7 +176,6 @@ def inventory_map():
         subcategories_by_parent = {}
     
     return render_template('inventory/map.html',
-                         items=items,
                          total_items=total_items,
                          by_category=by_category,
                          by_main_category=by_main_category,
@@ -235,13 +207,10 @@ def report_item():
                 flash(_('Por favor, sube una imagen válida (JPG, PNG, GIF)'), 'error')
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
             
-            # Save image temporarily to extract GPS
-            filename = secure_filename(f"{datetime.now().timestamp()}_{file.filename}")
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
             # Try to extract GPS coordinates from image (PRIORITY 1)
-            image_gps_lat, image_gps_lng = extract_gps_from_image(file_path)
+            # Se lee el EXIF directamente del stream subido: las subidas rechazadas
+            # (sin coordenadas, fuera del límite, categoría inválida) nunca tocan disco
+            image_gps_lat, image_gps_lng = extract_gps_from_image(file.stream)
             current_app.logger.info(f"📍 GPS extraído de imagen: lat={image_gps_lat}, lng={image_gps_lng}")
             
             latitude = image_gps_lat
@@ -267,13 +236,6 @@ def report_item():
             # If still no coordinates, show error with helpful message
             if latitude is None or longitude is None:
                 flash(_('No se pudo obtener la ubicación de la foto (no tiene coordenadas GPS). Por favor, selecciona la ubicación en el mapa o usa el botón "Usar la meva ubicació actual".'), 'error')
-                # Clean up uploaded file
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                # Pre-fill form with uploaded image info for retry
-                form.category.data = form.category.data
-                form.subcategory.data = form.subcategory.data
-                form.description.data = form.description.data
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
 
             # If both image GPS and chosen coords differ significantly, warn but keep user choice
@@ -300,59 +262,52 @@ def report_item():
                     f'lat={latitude}, lng={longitude}, source={location_source}'
                 )
                 flash(_('Les coordenades estan fora del límit de Tarragona. Si us plau, assegura\'t que la foto sigui dins de la ciutat o selecciona una ubicació dins del límit.'), 'error')
-                # Clean up uploaded file
-                if os.path.exists(file_path):
-                    os.remove(file_path)
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
             
-            # Optimize original image (basic optimization, full resize will be done async)
-            optimize_image(file_path)  # Basic optimization in place
-            
-            # Upload original file to storage (Bunny or local)
-            # This ensures the file is available even before async resize completes
-            # For Bunny: delete local file after upload (volumes are not shared, resize on-the-fly)
-            # For local: keep file (it's already in the right place, worker will process it)
-            try:
-                from app.storage import get_storage
-                storage = get_storage()
-                storage_provider = current_app.config.get('STORAGE_PROVIDER', 'local').lower()
-                
-                current_app.logger.info(f'📤 Uploading original file to storage (provider={storage_provider}): {filename}')
-                # For Bunny, delete after upload since volumes are not shared
-                # Bunny: resize is done on-the-fly by CDN, no worker needed
-                delete_after = (storage_provider == 'bunny')
-                storage.save(filename, file_path, delete_after_upload=delete_after)
-                current_app.logger.info(f'✅ Original file uploaded to storage: {filename}')
-            except Exception as e:
-                current_app.logger.error(f'❌ Error uploading original file to storage: {e}', exc_info=True)
-                # Continue anyway - the file is still in local storage
-            
-            # Get address from form or geocode (optional)
-            address = form.address.data if form.address.data else None
-            
             # Validate: reject 'escombreries_desbordades' - now handled by Container Points
             if form.subcategory.data == 'escombreries_desbordades':
                 flash(_('Els punts de contenidors desbordats ara es gestionen mitjançant el sistema de punts de contenidors al mapa. Si us plau, utilitza aquesta funcionalitat per reportar desbordaments.'), 'error')
-                # Clean up uploaded file
-                if os.path.exists(file_path):
-                    os.remove(file_path)
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
             
             # Buscar las categorías en InventoryCategory usando los códigos del formulario
             main_category = InventoryCategory.query.filter_by(code=form.category.data, parent_id=None).first()
             if not main_category:
                 flash(_('Categoría no válida'), 'error')
-                if os.path.exists(file_path):
-                    os.remove(file_path)
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
             
             subcategory = InventoryCategory.query.filter_by(code=form.subcategory.data, parent_id=main_category.id).first()
             if not subcategory:
                 flash(_('Subcategoría no válida para esta categoría'), 'error')
-                if os.path.exists(file_path):
-                    os.remove(file_path)
                 return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
             
+            # All validation passed: now persist the image to disk
+            filename = unique_upload_filename(file.filename)
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            file.save(file_path)
+            
+            # Local: optimización y subida las hace el worker (resize_image_task), la respuesta no espera a Pillow.
+            # Bunny: los volúmenes no se comparten con el worker, así que optimizar + subir
+            # tiene que hacerse aquí (la CDN redimensiona on-the-fly)
+            storage_provider = current_app.config.get('STORAGE_PROVIDER', 'local').lower()
+            upload_future = None
+            if storage_provider == 'bunny':
+                optimize_image(file_path)  # Basic optimization in place
+                try:
+                    from app.storage import get_storage
+                    storage = get_storage()
+                    
+                    current_app.logger.info(f'📤 Uploading original file to storage (provider={storage_provider}): {filename}')
+                    # La subida corre en paralelo con la asignación de sección y el INSERT;
+                    # se espera a que termine tras el commit.
+                    # Delete after upload since volumes are not shared
+                    upload_future = storage.save_async(filename, file_path, delete_after_upload=True)
+                except Exception as e:
+                    current_app.logger.error(f'❌ Error uploading original file to storage: {e}', exc_info=True)
+                    # Continue anyway - the file is still in local storage
+            
+            # Get address from form or geocode (optional)
+            address = form.address.data if form.address.data else None
+            
             # Create item with all data including GPS from image
             current_app.logger.info(
                 f"💾 Guardando item con:\n"
@@ -394,9 +349,18 @@ def report_item():
             db.session.add(item)
             db.session.commit()
             
-            # Enqueue image resizing task (async) - only for local, not for Bunny
+            if upload_future is not None:
+                try:
+                    upload_future.result()
+                    current_app.logger.info(f'✅ Original file uploaded to storage: {filename}')
+                except Exception as e:
+                    current_app.logger.error(f'❌ Error uploading original file to storage: {e}', exc_info=True)
+                    # Continue anyway - the file is still in local storage
+            
+            # Enqueue image processing task (async) - only for local, not for Bunny
             # BunnyCDN does resize on-the-fly using Image Classes, no worker processing needed
             if storage_provider != 'bunny':
+                resize_enqueued = False
                 try:
                     # Check if Celery is available
                     celery = getattr(current_app, 'celery', None)
@@ -420,6 +384,7 @@ def report_item():
                                 f'📸 Attempting to enqueue image resizing task for item {item.id}: {filename}'
                             )
                             result = resize_task.delay(item.id, filename)
+                            resize_enqueued = True
                             task_id = result.id if hasattr(result, 'id') else 'N/A'
                             current_app.logger.info(
                                 f'✅ Image resizing task enqueued successfully for item {item.id}: '
@@ -433,6 +398,10 @@ def report_item():
                 except Exception as e:
                     current_app.logger.error(f'❌ Error enqueueing image resize task: {e}', exc_info=True)
                     # Continue anyway, image will be available in original size
+                
+                if not resize_enqueued:
+                    # Sin worker: al menos dejar la imagen original optimizada
+                    optimize_image(file_path)
             else:
                 current_app.logger.info(
                     f'ℹ️ Skipping image resize task for BunnyCDN (provider={storage_provider}). '
@@ -462,19 +431,15 @@ def report_item():
     
     return render_template('inventory/report.html', form=form, subcategories_by_parent=_get_subcategories_by_parent())
 
-@bp.route('/api/items')
-def api_items():
-    """API endpoint para obtener items del inventario (para el mapa)"""
-    # Si se accede directamente desde el navegador, redirigir al mapa
-    if request.headers.get('Accept', '').find('text/html') != -1:
-        return redirect(url_for('inventory.inventory_map'))
-    category_url = request.args.get('category')
-    subcategory_url = request.args.get('subcategory')
-    
-    # Convertir de valores URL (catalán) a valores técnicos (BD)
-    category = normalize_category_from_url(category_url)
-    subcategory = normalize_subcategory_from_url(subcategory_url)
-    
+@cache.memoize(timeout=300)
+def _public_items_data(category, subcategory, locale):
+    """Lista de items visibles en el mapa, sin datos por usuario.
+    
+    Se cachea por (categoría, subcategoría, idioma) porque el conjunto de items
+    visibles solo cambia con aprobaciones, votos o reportes; ver
+    invalidate_public_items_cache(). El idioma forma parte de la clave porque
+    'full_category' se traduce.
+    """
     # Only return approved items (visible in map)
     query = InventoryItem.query.filter(
         InventoryItem.status.in_(InventoryItemStatus.visible_statuses())
@@ -495,26 +460,20 @@ def api_items():
         if subcategory_obj:
             query = query.filter(InventoryItem.categories.any(InventoryCategory.id == subcategory_obj.id))
     
-    items = query.all()
-    
-    items_data = []
-    user_id = current_user.id if current_user.is_authenticated else None
-    
-    for item in items:
-        has_voted = item.has_user_voted(user_id) if user_id else False
-        # Ensure importance_count is never None
-        importance_count = item.importance_count if item.importance_count is not None else 0
-        # Check if user has reported "ya no está"
-        has_resolved = item.has_user_resolved(user_id) if user_id else False
-        resolved_count = item.resolved_count if item.resolved_count is not None else 0
-        
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        sub_cats = [cat for cat in item.categories if cat.parent_id is not None]
-        item_category = main_cats[0].code if main_cats else None
-        item_subcategory = sub_cats[0].code if sub_cats else None
-        
-        items_data.append({
+    # Los contadores se normalizan en SQL (COALESCE) para no recibir nunca None
+    # Categorías en una sola consulta IN; cualquier otra relación perezosa falla
+    # en lugar de disparar consultas por item
+    rows = query.options(
+        selectinload(InventoryItem.categories),
+        raiseload('*')
+    ).add_columns(
+        func.coalesce(InventoryItem.importance_count, 0).label('importance_count'),
+        func.coalesce(InventoryItem.resolved_count, 0).label('resolved_count'),
+    ).all()
+    
+    def item_to_dict(item, importance_count, resolved_count):
+        item_category, item_subcategory = _item_category_codes(item)
+        return {
             'id': item.id,
             'category': item_category,
             'subcategory': item_subcategory,
@@ -529,53 +488,130 @@ def api_items():
             'image_url': get_image_url(item.image_path, 'medium'),
             'image_url_thumbnail': get_image_url(item.image_path, 'thumbnail'),
             'importance_count': importance_count,
-            'has_voted': has_voted,
             'resolved_count': resolved_count,
-            'share_count': item.share_count or 0,
-            'has_resolved': has_resolved,
-            'created_at': item.created_at.isoformat() if item.created_at else None
-        })
+            'created_at': item.created_at,  # orjson lo serializa en ISO 8601
+        }
+    
+    items_data = [item_to_dict(*row) for row in rows]
     
-    return jsonify(items_data)
+    return items_data
+
+@bp.record_once
+def _configure_public_items_cache(state):
+    """Aplicar PUBLIC_ITEMS_CACHE_TIMEOUT (corto sin Redis, ver config) a la caché del mapa"""
+    _public_items_data.cache_timeout = state.app.config.get('PUBLIC_ITEMS_CACHE_TIMEOUT', 300)
+
+def invalidate_public_items_cache():
+    """Invalidar la lista cacheada de items del mapa (todas las combinaciones).
+    
+    Con SimpleCache solo afecta al proceso actual; los demás workers expiran su
+    copia por PUBLIC_ITEMS_CACHE_TIMEOUT. En despliegues con varios workers hace
+    falta un backend compartido (Redis) para que la invalidación sea inmediata.
+    """
+    try:
+        cache.delete_memoized(_public_items_data)
+    except Exception as e:
+        current_app.logger.warning(f"Error invalidating public items cache: {e}")
+
+@bp.route('/api/items')
+def api_items():
+    """API endpoint para obtener items del inventario (para el mapa)"""
+    # Si se accede directamente desde el navegador, redirigir al mapa
+    if _browser_navigation():
+        return redirect(url_for('inventory.inventory_map'))
+    category_url = request.args.get('category')
+    subcategory_url = request.args.get('subcategory')
+    
+    # Convertir de valores URL (catalán) a valores técnicos (BD)
+    category = normalize_category_from_url(category_url)
+    subcategory = normalize_subcategory_from_url(subcategory_url)
+    
+    public_items = _public_items_data(category, subcategory, get_locale())
+    
+    # Superponer los datos del usuario (votos / "ya no está") sobre la lista cacheada,
+    # consultando solo los items de esa lista (no todo el historial del usuario)
+    voted_ids = set()
+    resolved_ids = set()
+    if current_user.is_authenticated and public_items:
+        item_ids = [item_data['id'] for item_data in public_items]
+        voted_ids = {
+            item_id for (item_id,) in
+            db.session.query(InventoryVote.item_id).filter(
+                InventoryVote.user_id == current_user.id,
+                InventoryVote.item_id.in_(item_ids)
+            )
+        }
+        resolved_ids = {
+            item_id for (item_id,) in
+            db.session.query(InventoryResolved.item_id).filter(
+                InventoryResolved.user_id == current_user.id,
+                InventoryResolved.item_id.in_(item_ids)
+            )
+        }
+    
+    items_data = [
+        dict(
+            item_data,
+            has_voted=item_data['id'] in voted_ids,
+            has_resolved=item_data['id'] in resolved_ids
+        )
+        for item_data in public_items
+    ]
+    
+    return _json_response(items_data)
+
+# Caché en proceso de las respuestas GeoJSON de secciones y boundary (datos de
+# referencia casi estáticos). Cada entrada es (versión, bytes JSON); la versión se
+# obtiene con una consulta ligera, así que una edición de geometría (que actualiza
+# updated_at) regenera la respuesta en todos los workers sin invalidación explícita.
+_sections_geojson_cache = (None, None)
+_boundary_geojson_cache = (None, None)
+
+def _build_sections_geojson():
+    """Serializar todas las secciones con su polígono en GeoJSON"""
+    from shapely import wkt
+    
+    sections = Section.query.join(District).order_by(Section.district_code, Section.code).all()
+    
+    result = []
+    for section in sections:
+        if section.polygon:
+            try:
+                # Parsear WKT a geometría Shapely
+                geom = wkt.loads(section.polygon)
+                
+                # No aplicar buffer - usar geometría original para evitar solapamientos
+                result.append({
+                    'id': section.id,
+                    'code': section.code,
+                    'district_code': section.district_code,
+                    'district_name': section.district.name,
+                    'name': section.name or f"Secció {section.code}",
+                    'full_code': section.full_code,
+                    'geometry': geom.__geo_interface__  # orjson serializa el dict directamente
+                })
+            except Exception as e:
+                current_app.logger.warning(f"Error parsing polygon for section {section.id}: {e}")
+                continue
+    
+    return orjson.dumps(result)
 
 @bp.route('/api/sections')
 def api_sections():
     """API endpoint para obtener todas las secciones con sus polígonos"""
+    global _sections_geojson_cache
     # Si se accede directamente desde el navegador, redirigir al mapa
-    if request.headers.get('Accept', '').find('text/html') != -1:
+    if _browser_navigation():
         return redirect(url_for('inventory.inventory_map'))
     
     try:
-        from shapely import wkt
-        import json
-        
-        sections = Section.query.join(District).order_by(Section.district_code, Section.code).all()
+        version = tuple(db.session.query(func.count(Section.id), func.max(Section.updated_at)).one())
+        cached_version, body = _sections_geojson_cache
+        if body is None or cached_version != version:
+            body = _build_sections_geojson()
+            _sections_geojson_cache = (version, body)
         
-        result = []
-        for section in sections:
-            if section.polygon:
-                try:
-                    # Parsear WKT a geometría Shapely
-                    geom = wkt.loads(section.polygon)
-                    
-                    # No aplicar buffer - usar geometría original para evitar solapamientos
-                    # Convertir a GeoJSON directamente
-                    geojson = json.loads(json.dumps(geom.__geo_interface__))
-                    
-                    result.append({
-                        'id': section.id,
-                        'code': section.code,
-                        'district_code': section.district_code,
-                        'district_name': section.district.name,
-                        'name': section.name or f"Secció {section.code}",
-                        'full_code': section.full_code,
-                        'geometry': geojson
-                    })
-                except Exception as e:
-                    current_app.logger.warning(f"Error parsing polygon for section {section.id}: {e}")
-                    continue
-        
-        return jsonify(result)
+        return current_app.response_class(body, mimetype='application/json')
     except ImportError:
         current_app.logger.error("Shapely not available for WKT parsing")
         return jsonify({'error': 'WKT parsing not available'}), 500
@@ -583,83 +619,64 @@ def api_sections():
         current_app.logger.error(f"Error in api_sections: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _build_boundary_geojson(boundary):
+    """Serializar el boundary de la ciudad (geometría + bounds con margen)"""
+    from shapely import wkt
+    
+    # Parsear WKT a geometría Shapely
+    geom = wkt.loads(boundary.polygon)
+    
+    # Bounding box directamente de la geometría ya parseada (sin round-trip a PostGIS)
+    # Añadir un margen del 20% al bounding box para permitir algo de movimiento
+    min_lng, min_lat, max_lng, max_lat = geom.bounds
+    margin_lng = (max_lng - min_lng) * 0.2
+    margin_lat = (max_lat - min_lat) * 0.2
+    bounds = {
+        'southwest': [min_lat - margin_lat, min_lng - margin_lng],
+        'northeast': [max_lat + margin_lat, max_lng + margin_lng]
+    }
+    
+    return orjson.dumps({
+        'id': boundary.id,
+        'name': boundary.name,
+        'calculated_at': boundary.calculated_at,
+        'geometry': geom.__geo_interface__,
+        'bounds': bounds
+    })
+
 @bp.route('/api/boundary')
 def api_boundary():
     """API endpoint para obtener el boundary de la ciudad"""
+    global _boundary_geojson_cache
     # Si se accede directamente desde el navegador, redirigir al mapa
-    if request.headers.get('Accept', '').find('text/html') != -1:
+    if _browser_navigation():
         return redirect(url_for('inventory.inventory_map'))
     
     try:
-        from shapely import wkt
-        import json
+        import shapely  # noqa: F401 - comprobar disponibilidad antes de consultar
         
-        boundary = CityBoundary.query.first()
+        version = db.session.query(
+            CityBoundary.id, CityBoundary.updated_at, CityBoundary.calculated_at
+        ).first()
         
-        if not boundary or not boundary.polygon:
+        if not version:
             return jsonify({'error': 'City boundary not found'}), 404
+        version = tuple(version)
         
-        try:
-            from sqlalchemy import func
-            from app.extensions import db
+        cached_version, body = _boundary_geojson_cache
+        if body is None or cached_version != version:
+            boundary = db.session.get(CityBoundary, version[0])
+            if not boundary or not boundary.polygon:
+                return jsonify({'error': 'City boundary not found'}), 404
             
-            # Parsear WKT a geometría Shapely
-            geom = wkt.loads(boundary.polygon)
-            
-            # Convertir a GeoJSON
-            geojson = json.loads(json.dumps(geom.__geo_interface__))
-            
-            # Calcular bounding box usando PostGIS
             try:
-                boundary_geom = func.ST_GeomFromText(boundary.polygon, 4326)
-                bbox_result = db.session.query(
-                    func.ST_XMin(func.ST_Envelope(boundary_geom)).label('min_lng'),
-                    func.ST_YMin(func.ST_Envelope(boundary_geom)).label('min_lat'),
-                    func.ST_XMax(func.ST_Envelope(boundary_geom)).label('max_lng'),
-                    func.ST_YMax(func.ST_Envelope(boundary_geom)).label('max_lat')
-                ).first()
-                
-                if bbox_result:
-                    # Añadir un margen del 20% al bounding box para permitir algo de movimiento
-                    lng_range = bbox_result.max_lng - bbox_result.min_lng
-                    lat_range = bbox_result.max_lat - bbox_result.min_lat
-                    margin_lng = lng_range * 0.2
-                    margin_lat = lat_range * 0.2
-                    
-                    bounds = {
-                        'southwest': [bbox_result.min_lat - margin_lat, bbox_result.min_lng - margin_lng],
-                        'northeast': [bbox_result.max_lat + margin_lat, bbox_result.max_lng + margin_lng]
-                    }
-                else:
-                    bounds = None
+                body = _build_boundary_geojson(boundary)
             except Exception as e:
-                current_app.logger.warning(f"Error calculating bounds with PostGIS: {e}")
-                # Fallback: usar Shapely para calcular bounds
-                try:
-                    bounds_obj = geom.bounds  # (minx, miny, maxx, maxy)
-                    lng_range = bounds_obj[2] - bounds_obj[0]
-                    lat_range = bounds_obj[3] - bounds_obj[1]
-                    margin_lng = lng_range * 0.2
-                    margin_lat = lat_range * 0.2
-                    
-                    bounds = {
-                        'southwest': [bounds_obj[1] - margin_lat, bounds_obj[0] - margin_lng],
-                        'northeast': [bounds_obj[3] + margin_lat, bounds_obj[2] + margin_lng]
-                    }
-                except Exception as e2:
-                    current_app.logger.warning(f"Error calculating bounds with Shapely: {e2}")
-                    bounds = None
-            
-            return jsonify({
-                'id': boundary.id,
-                'name': boundary.name,
-                'calculated_at': boundary.calculated_at.isoformat() if boundary.calculated_at else None,
-                'geometry': geojson,
-                'bounds': bounds
-            })
-        except Exception as e:
-            current_app.logger.error(f"Error parsing boundary polygon: {e}")
-            return jsonify({'error': 'Error parsing boundary geometry'}), 500
+                current_app.logger.error(f"Error parsing boundary polygon: {e}")
+                return jsonify({'error': 'Error parsing boundary geometry'}), 500
+            _boundary_geojson_cache = (version, body)
+        
+        return current_app.response_class(body, mimetype='application/json')
         
     except ImportError:
         current_app.logger.error("Shapely not available for WKT parsing")
@@ -677,7 +694,7 @@ def api_container_points():
     muestre los polígonos (y parpadeo si están desbordados).
     """
     # Si se accede directamente desde el navegador, redirigir al mapa
-    if request.headers.get('Accept', '').find('text/html') != -1:
+    if _browser_navigation():
         return redirect(url_for('inventory.inventory_map'))
     
     try:
@@ -960,7 +977,11 @@ def delete_container_point(point_id):
 @bp.route('/<int:item_id>')
 def item_detail(item_id):
     """Página de detalle de un item del inventario"""
-    item = InventoryItem.query.get_or_404(item_id)
+    # reporter y section se muestran en la plantilla: cargarlos en la misma consulta
+    item = InventoryItem.query.options(
+        joinedload(InventoryItem.reporter),
+        joinedload(InventoryItem.section)
+    ).get_or_404(item_id)
     
     # Check if user can view this item
     # Public can only see approved items
@@ -989,14 +1010,13 @@ def item_detail(item_id):
     has_voted = False
     has_resolved = False
     if current_user.is_authenticated:
-        has_voted = InventoryVote.query.filter_by(
-            item_id=item_id,
-            user_id=current_user.id
-        ).first() is not None
-        has_resolved = InventoryResolved.query.filter_by(
-            item_id=item_id,
-            user_id=current_user.id
-        ).first() is not None
+        # EXISTS escalar: la BD devuelve un booleano, sin hidratar filas
+        has_voted = db.session.query(
+            InventoryVote.query.filter_by(item_id=item_id, user_id=current_user.id).exists()
+        ).scalar()
+        has_resolved = db.session.query(
+            InventoryResolved.query.filter_by(item_id=item_id, user_id=current_user.id).exists()
+        ).scalar()
     
     return render_template('inventory/detail.html',
                          item=item,
@@ -1017,26 +1037,28 @@ def vote_item(item_id):
     
     item = InventoryItem.query.get_or_404(item_id)
     
-    # Check if user has already voted
-    if item.has_user_voted(current_user.id):
+    # Create vote: INSERT ... ON CONFLICT DO NOTHING sobre UNIQUE (item_id, user_id).
+    # rowcount == 0 significa voto duplicado, sin SELECT previo ni excepción
+    result = db.session.execute(
+        pg_insert(InventoryVote)
+        .values(item_id=item.id, user_id=current_user.id)
+        .on_conflict_do_nothing(constraint='unique_item_user_vote')
+    )
+    if result.rowcount == 0:
+        db.session.rollback()
         return jsonify({'error': _('Ya has votado este item')}), 400
     
-    # Create vote
-    vote = InventoryVote(item_id=item.id, user_id=current_user.id)
-    db.session.add(vote)
-    
-    # Increment importance count (handle None case for existing items)
-    if item.importance_count is None:
-        item.importance_count = 0
-    item.importance_count += 1
+    # Increment importance count in SQL (COALESCE covers legacy NULL rows)
+    item.importance_count = func.coalesce(InventoryItem.importance_count, 0) + 1
     db.session.commit()
+    invalidate_public_items_cache()
     
     current_app.logger.info(f'User {current_user.id} voted for inventory item {item.id}')
     
     return jsonify({
         'success': True,
         'importance_count': item.importance_count,
-        'resolved_count': item.resolved_count if item.resolved_count is not None else 0,
+        'resolved_count': item.resolved_count,
         'has_resolved': item.has_user_resolved(current_user.id),
         'message': _('Voto registrado correctamente')
     })
@@ -1056,13 +1078,14 @@ def resolve_item(item_id):
         return jsonify({'error': message}), 400
     
     db.session.commit()
+    invalidate_public_items_cache()
     
     current_app.logger.info(f'User {current_user.id} reported item {item.id} as resolved (count: {item.resolved_count})')
     
     return jsonify({
         'success': True,
         'resolved_count': item.resolved_count,
-        'importance_count': item.importance_count if item.importance_count is not None else 0,
+        'importance_count': item.importance_count,
         'has_voted': False,  # Now false since we removed it
         'status': item.status,
         'auto_resolved': auto_resolved,
@@ -1081,6 +1104,7 @@ def share_item(item_id):
     item.share_count += 1
     
     db.session.commit()
+    invalidate_public_items_cache()
     
     current_app.logger.info(f'Item {item.id} shared (count: {item.share_count})')
     
@@ -1174,17 +1198,16 @@ def admin_pending_map():
 @roles_required('admin')
 def api_pending_items():
     """API endpoint para obtener items pendientes (para el mapa de admin)"""
-    items = InventoryItem.query.filter(InventoryItem.status == InventoryItemStatus.PENDING.value).all()
-    
-    items_data = []
-    for item in items:
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        sub_cats = [cat for cat in item.categories if cat.parent_id is not None]
-        item_category = main_cats[0].code if main_cats else None
-        item_subcategory = sub_cats[0].code if sub_cats else None
-        
-        items_data.append({
+    # Cargar reporter y categorías en bloque (una consulta IN por relación, sin N+1)
+    items = InventoryItem.query.options(
+        selectinload(InventoryItem.reporter),
+        selectinload(InventoryItem.categories),
+        raiseload('*')
+    ).filter(InventoryItem.status == InventoryItemStatus.PENDING.value).all()
+    
+    def item_to_dict(item):
+        item_category, item_subcategory = _item_category_codes(item)
+        return {
             'id': item.id,
             'category': item_category,
             'subcategory': item_subcategory,
@@ -1199,10 +1222,12 @@ def api_pending_items():
             'image_url': get_image_url(item.image_path, 'medium') if item.image_path else None,
             'image_url_thumbnail': get_image_url(item.image_path, 'thumbnail') if item.image_path else None,
             'reporter': item.reporter.username if item.reporter else None,
-            'created_at': item.created_at.isoformat() if item.created_at else None
-        })
+            'created_at': item.created_at,  # orjson lo serializa en ISO 8601
+        }
     
-    return jsonify(items_data)
+    items_data = [item_to_dict(item) for item in items]
+    
+    return _json_response(items_data)
 
 @bp.route('/admin')
 @login_required
@@ -1216,41 +1241,38 @@ def admin_inventory():
     
     # Build query
     query = InventoryItem.query
-    if status_filter != 'all':
+    # Ignorar estados desconocidos: el enum de PostgreSQL rechaza valores fuera de él
+    if status_filter != 'all' and status_filter in InventoryItemStatus.all():
         query = query.filter(InventoryItem.status == status_filter)
     
-    # Paginate results
-    pagination = query.order_by(InventoryItem.created_at.desc()).paginate(
+    # Paginate results (categorías y reporter se pintan por fila: cargarlos en bloque)
+    pagination = query.options(
+        selectinload(InventoryItem.categories),
+        selectinload(InventoryItem.reporter)
+    ).order_by(InventoryItem.created_at.desc()).paginate(
         page=page,
         per_page=per_page,
         error_out=False
     )
     items = pagination.items
     
-    # Statistics
-    total_items = InventoryItem.query.count()
-    pending_items = InventoryItem.query.filter(InventoryItem.status == InventoryItemStatus.PENDING.value).count()
-    approved_items = InventoryItem.query.filter(InventoryItem.status == InventoryItemStatus.APPROVED.value).count()
-    resolved_items = InventoryItem.query.filter(InventoryItem.status == InventoryItemStatus.RESOLVED.value).count()
-    rejected_items = InventoryItem.query.filter(InventoryItem.status == InventoryItemStatus.REJECTED.value).count()
-    
-    by_category = {}
-    for item in InventoryItem.query.filter(
-        InventoryItem.status.in_(InventoryItemStatus.visible_statuses())
-    ).all():
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        if main_cats:
-            cat_key = main_cats[0].code
-        else:
-            cat_key = "no-category"
-        by_category[cat_key] = by_category.get(cat_key, 0) + 1
-    
-    # Contar items aprobados con resolved_count > 0
-    items_with_resolved = InventoryItem.query.filter(
-        InventoryItem.status == InventoryItemStatus.APPROVED.value,
-        InventoryItem.resolved_count > 0
-    ).count()
+    # Statistics: un único GROUP BY status en lugar de un COUNT(*) por estado.
+    # En la misma pasada se cuentan los items con reportes "ya no está" (resolved_count > 0)
+    status_rows = db.session.query(
+        InventoryItem.status,
+        func.count(InventoryItem.id),
+        func.count(case((InventoryItem.resolved_count > 0, 1)))
+    ).group_by(InventoryItem.status).all()
+    status_counts = {status: n for status, n, _with_resolved in status_rows}
+    with_resolved_counts = {status: n for status, _n, n in status_rows}
+    total_items = sum(status_counts.values())
+    pending_items = status_counts.get(InventoryItemStatus.PENDING.value, 0)
+    approved_items = status_counts.get(InventoryItemStatus.APPROVED.value, 0)
+    resolved_items = status_counts.get(InventoryItemStatus.RESOLVED.value, 0)
+    rejected_items = status_counts.get(InventoryItemStatus.REJECTED.value, 0)
+    
+    # Items aprobados con resolved_count > 0 (de la agregación por estado)
+    items_with_resolved = with_resolved_counts.get(InventoryItemStatus.APPROVED.value, 0)
     
     return render_template('inventory/admin.html',
                          items=items,
@@ -1260,7 +1282,6 @@ def admin_inventory():
                          approved_items=approved_items,
                          resolved_items=resolved_items,
                          rejected_items=rejected_items,
-                         by_category=by_category,
                          status_filter=status_filter,
                          page=page,
                          per_page=per_page,
@@ -1308,6 +1329,7 @@ def admin_resolve_item(id):
     success, message = item.resolve(resolved_by=current_user)
     if success:
         db.session.commit()
+        invalidate_public_items_cache()
         
         # Send resolution email if reporter exists
         if item.reporter:
@@ -1336,15 +1358,20 @@ def admin_resolve_item(id):
 def delete_item(id):
     """Eliminar item del inventario"""
     item = InventoryItem.query.get_or_404(id)
-    
-    # Delete associated image if exists
-    if item.image_path:
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], item.image_path)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    image_path = item.image_path
     
     db.session.delete(item)
     db.session.commit()
+    invalidate_public_items_cache()
+    
+    # Delete associated image once the row is gone (un solo unlink, sin os.path.exists previo)
+    if image_path:
+        try:
+            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], image_path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            current_app.logger.warning(f'Could not delete image {image_path} for item {id}: {e}')
     
     flash(_('Item eliminado'), 'success')
     # Redirect back to the same page and filter (from form data or args)
@@ -1379,22 +1406,35 @@ def section_responsible_dashboard():
     
     # Filtros
     status_filter = request.args.get('status', 'all')
-    if status_filter != 'all':
+    # Ignorar estados desconocidos: el enum de PostgreSQL rechaza valores fuera de él
+    if status_filter != 'all' and status_filter in InventoryItemStatus.all():
         query = query.filter(InventoryItem.status == status_filter)
     
     # Paginación
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    pagination = query.order_by(InventoryItem.created_at.desc()).paginate(
+    # La plantilla muestra item.section en cada fila: cargarlas en bloque
+    pagination = query.options(
+        selectinload(InventoryItem.section)
+    ).order_by(InventoryItem.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    # Estadísticas
+    # Estadísticas: un único GROUP BY status sobre la misma consulta filtrada.
+    # Con un estado concreto filtrado, el COUNT(*) de paginate ya da todo lo necesario
+    if status_filter != 'all' and status_filter in InventoryItemStatus.all():
+        status_counts = {status_filter: pagination.total}
+    else:
+        status_counts = dict(
+            query.with_entities(InventoryItem.status, func.count(InventoryItem.id))
+            .group_by(InventoryItem.status)
+            .all()
+        )
     stats = {
-        'total': query.count(),
-        'pending': query.filter(InventoryItem.status == InventoryItemStatus.PENDING.value).count(),
-        'approved': query.filter(InventoryItem.status == InventoryItemStatus.APPROVED.value).count(),
-        'resolved': query.filter(InventoryItem.status == InventoryItemStatus.RESOLVED.value).count(),
+        'total': pagination.total,
+        'pending': status_counts.get(InventoryItemStatus.PENDING.value, 0),
+        'approved': status_counts.get(InventoryItemStatus.APPROVED.value, 0),
+        'resolved': status_counts.get(InventoryItemStatus.RESOLVED.value, 0),
     }
     
     return render_template('inventory/section_responsible.html',
@@ -1404,15 +1444,26 @@ def section_responsible_dashboard():
                          stats=stats,
                          status_filter=status_filter)
 
+def _get_managed_item(item_id):
+    """Item si pertenece a una sección gestionada por el usuario actual, o None
+    (no existe o no tiene permisos). Filtra la pertenencia en la misma consulta"""
+    from app.models import SectionResponsible
+    managed_section_ids = db.session.query(SectionResponsible.section_id).filter(
+        SectionResponsible.user_id == current_user.id
+    )
+    return InventoryItem.query.filter(
+        InventoryItem.id == item_id,
+        InventoryItem.section_id.in_(managed_section_ids)
+    ).first()
+
 @bp.route('/section-responsible/<int:id>/approve', methods=['POST'])
 @login_required
 @section_responsible_required
 def section_responsible_approve(id):
     """Aprobar item (solo si es de una sección gestionada)"""
-    item = InventoryItem.query.get_or_404(id)
-    
-    # Verificar que el item pertenece a una sección gestionada
-    if not current_user.is_section_responsible(item.section_id):
+    # Carga + verificación de sección gestionada en una sola consulta
+    item = _get_managed_item(id)
+    if item is None:
         flash(_('No tienes permisos para gestionar este item'), 'error')
         return redirect(url_for('inventory.section_responsible_dashboard'))
     
@@ -1422,6 +1473,7 @@ def section_responsible_approve(id):
         flash(message, 'warning')
     else:
         db.session.commit()
+        invalidate_public_items_cache()
         flash(message, 'success')
     
     return redirect(url_for('inventory.section_responsible_dashboard'))
@@ -1431,9 +1483,9 @@ def section_responsible_approve(id):
 @section_responsible_required
 def section_responsible_resolve(id):
     """Marcar item como resuelto"""
-    item = InventoryItem.query.get_or_404(id)
-    
-    if not current_user.is_section_responsible(item.section_id):
+    # Carga + verificación de sección gestionada en una sola consulta
+    item = _get_managed_item(id)
+    if item is None:
         flash(_('No tienes permisos para gestionar este item'), 'error')
         return redirect(url_for('inventory.section_responsible_dashboard'))
     
@@ -1443,6 +1495,7 @@ def section_responsible_resolve(id):
         flash(message, 'warning')
     else:
         db.session.commit()
+        invalidate_public_items_cache()
         flash(message, 'success')
     
     return redirect(url_for('inventory.section_responsible_dashboard'))
@@ -1,12 +1,54 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, abort
 from flask_babel import gettext as _
 from app.models import Initiative, Comment, user_initiatives, InventoryItem, InventoryItemStatus, InventoryCategory
-from app.extensions import db
+from app.extensions import db, cache
+from app.services.email_service import EmailService
 from datetime import datetime
-from sqlalchemy import not_
+import secrets
+from sqlalchemy import not_, func
+from app.queries import EXCLUDE_CONTAINER_OVERFLOW_ITEMS, item_category_codes_subquery
 
 bp = Blueprint('main', __name__)
 
+def _visible_inventory_query():
+    """Items visibles en la home, excluyendo los desbordamientos de contenedores
+    (ahora gestionados por Container Points)"""
+    return InventoryItem.query.filter(
+        InventoryItem.status.in_(InventoryItemStatus.visible_statuses()),
+        EXCLUDE_CONTAINER_OVERFLOW_ITEMS
+    )
+
+@cache.cached(timeout=60, key_prefix='home_stats')
+def _home_stats():
+    """Estadísticas agregadas de la home. Cambian en minutos, no en cada visita:
+    se cachean 60s para no repetir las agregaciones en cada carga"""
+    base_query = _visible_inventory_query()
+    
+    # Total + items por categoría principal en una sola agregación: el outer join deja
+    # los items sin categoría en el grupo NULL, que cuenta para el total pero no por categoría
+    item_cats = item_category_codes_subquery()
+    category_rows = base_query.with_entities(
+        item_cats.c.main_code,
+        func.count(InventoryItem.id)
+    ).select_from(InventoryItem).outerjoin(
+        item_cats, item_cats.c.item_id == InventoryItem.id
+    ).group_by(item_cats.c.main_code).all()
+    total_inventory_items = sum(n for _code, n in category_rows)
+    inventory_by_category = {category_code: n for category_code, n in category_rows if category_code}
+    
+    # Get statistics for initiatives (for secondary section)
+    total_initiatives = Initiative.query.filter(Initiative.status == 'approved').count()
+    total_participants = db.session.query(db.func.count(user_initiatives.c.user_id)).scalar() or 0
+    active_categories = db.session.query(Initiative.category).distinct().count()
+    
+    return {
+        'total_inventory_items': total_inventory_items,
+        'inventory_by_category': inventory_by_category,
+        'total_initiatives': total_initiatives,
+        'total_participants': total_participants,
+        'active_categories': active_categories,
+    }
+
 @bp.route('/')
 def index():
     # Get filter parameters for initiatives
@@ -19,54 +61,22 @@ def index():
     # Only show approved initiatives to public
     query = query.filter(Initiative.status == 'approved')
     
+    # Fecha calculada una vez por petición; se envía como parámetro enlazado
+    today = datetime.now().date()
     if status == 'upcoming':
-        query = query.filter(Initiative.date >= datetime.now().date())
+        query = query.filter(Initiative.date >= today)
     elif status == 'past':
-        query = query.filter(Initiative.date < datetime.now().date())
+        query = query.filter(Initiative.date < today)
     
     if category:
         query = query.filter(Initiative.category == category)
     
     initiatives = query.order_by(Initiative.date.asc()).limit(6).all()  # Limit to 6 for homepage
     
-    # Get inventory statistics (for hero section)
-    # Exclude container overflow items - now handled by Container Points
-    # Buscar items que NO tengan la categoría 'contenidors' con subcategorías de overflow
-    contenidors_cat = InventoryCategory.query.filter_by(code='contenidors', parent_id=None).first()
-    overflow_subcats = InventoryCategory.query.filter(
-        InventoryCategory.parent_id == contenidors_cat.id if contenidors_cat else None,
-        InventoryCategory.code.in_(['escombreries_desbordades', 'basura_desbordada', 'deixadesa'])
-    ).all() if contenidors_cat else []
-    
-    base_query = InventoryItem.query.filter(
-        InventoryItem.status.in_(InventoryItemStatus.visible_statuses())
-    )
-    
-    # Excluir items con categorías de overflow
-    if overflow_subcats:
-        overflow_category_ids = [cat.id for cat in overflow_subcats]
-        base_query = base_query.filter(
-            ~InventoryItem.categories.any(InventoryCategory.id.in_(overflow_category_ids))
-        )
-    
-    total_inventory_items = base_query.count()
-    
-    # Get inventory by category - usar relación many-to-many
-    inventory_by_category = {}
-    for item in base_query.all():
-        # Obtener categorías del item usando la relación many-to-many
-        main_cats = [cat for cat in item.categories if cat.parent_id is None]
-        if main_cats:
-            category_code = main_cats[0].code
-            inventory_by_category[category_code] = inventory_by_category.get(category_code, 0) + 1
+    stats = _home_stats()
     
     # Get recent inventory items (for featured section)
-    recent_inventory_items = base_query.order_by(InventoryItem.created_at.desc()).limit(8).all()
-    
-    # Get statistics for initiatives (for secondary section)
-    total_initiatives = Initiative.query.filter(Initiative.status == 'approved').count()
-    total_participants = db.session.query(db.func.count(user_initiatives.c.user_id)).scalar() or 0
-    active_categories = db.session.query(Initiative.category).distinct().count()
+    recent_inventory_items = _visible_inventory_query().order_by(InventoryItem.created_at.desc()).limit(8).all()
     
     # Load inventory categories from DB for hero section
     try:
@@ -80,13 +90,13 @@ def index():
     
     return render_template('index.html',
                          initiatives=initiatives,
-                         total_initiatives=total_initiatives,
-                         total_participants=total_participants,
-                         active_categories=active_categories,
+                         total_initiatives=stats['total_initiatives'],
+                         total_participants=stats['total_participants'],
+                         active_categories=stats['active_categories'],
                          selected_category=category,
                          selected_status=status,
-                         total_inventory_items=total_inventory_items,
-                         inventory_by_category=inventory_by_category,
+                         total_inventory_items=stats['total_inventory_items'],
+                         inventory_by_category=stats['inventory_by_category'],
                          recent_inventory_items=recent_inventory_items,
                          db_categories=db_categories)
 
@@ -94,33 +104,23 @@ def index():
 def about():
     return render_template('about.html')
 
+def _rotate_contact_token():
+    """Nuevo token anti doble envío para el formulario de contacto"""
+    session['contact_form_token'] = secrets.token_hex(16)
+
 @bp.route('/contact', methods=['GET', 'POST'])
 def contact():
-    from flask import current_app
     if request.method == 'POST':
         # Check for duplicate submission using session token
         form_token = request.form.get('form_token', '')
         session_token = session.get('contact_form_token')
         
-        # If tokens match, it's a valid first submission
-        # If they don't match (or token is missing), it could be a duplicate or invalid
-        if form_token and form_token == session_token:
-            # Valid submission - process it and generate new token
-            # Generate new token AFTER processing to prevent duplicates
-            import secrets
-            new_token = secrets.token_hex(16)
-            session['contact_form_token'] = new_token
-        elif form_token and session_token:
-            # Token mismatch - likely a duplicate submission
+        # If tokens match (or token is missing: first time or session expired), allow submission
+        # If they don't match, it's likely a duplicate submission
+        if form_token and session_token and form_token != session_token:
             current_app.logger.info(f'Duplicate contact form submission prevented from {request.form.get("email", "unknown")}')
             flash(_('El formulari ja s\'ha enviat. Si us plau, espera uns segons.'), 'info')
             return redirect(url_for('main.contact'))
-        else:
-            # No token in form or session - generate new one and allow submission
-            # (could be first time or session expired)
-            import secrets
-            new_token = secrets.token_hex(16)
-            session['contact_form_token'] = new_token
         
         # Get form data
         name = request.form.get('name', '')
@@ -134,48 +134,23 @@ def contact():
             flash(_('Si us plau, omple tots els camps obligatoris'), 'error')
             return redirect(url_for('main.contact'))
         
+        # Valid submission: rotate token BEFORE sending emails so a double click
+        # arriving meanwhile is detected as duplicate. Duplicates and invalid
+        # forms leave the session untouched (no new token generated)
+        _rotate_contact_token()
+        
         # Log contact form submission
         current_app.logger.info(f'Contact form submitted: {subject} from {email} ({name})')
         
-        # Send confirmation email to user (only if email is different from admin)
-        admin_email = current_app.config.get('ADMIN_EMAIL', 'hola@tarracograf.cat')
-        if email and email.lower() != admin_email.lower():
-            try:
-                from app.services.email_service import EmailService
-                EmailService.send_contact_form_response(email, subject, message)
-            except Exception as e:
-                current_app.logger.error(f'Error sending contact confirmation email: {str(e)}', exc_info=True)
-        
-        # Send notification to admin
-        if admin_email:
-            try:
-                from app.services.email_service import EmailService
-                current_app.logger.info(f'Sending admin notification to {admin_email} for contact form from {email}')
-                result = EmailService.send_admin_notification(
-                    admin_email,
-                    'Nou missatge de contacte',
-                    {
-                        'name': name,
-                        'email': email,
-                        'subject': subject,
-                        'message': message,
-                        'phone': phone if phone else 'No proporcionat'
-                    }
-                )
-                if result:
-                    current_app.logger.info(f'Admin notification email sent successfully to {admin_email}')
-                else:
-                    current_app.logger.warning(f'Admin notification email failed to send to {admin_email}')
-            except Exception as e:
-                current_app.logger.error(f'Error sending admin notification: {str(e)}', exc_info=True)
+        # Confirmación al usuario + aviso al admin (encolados en Celery si está activo)
+        EmailService.send_contact_form_emails(name, email, subject, message, phone)
         
         flash(_('Gràcies pel teu missatge. Et respondrem aviat.'), 'success')
         return redirect(url_for('main.contact'))
     
     # Generate form token for GET request (to prevent double submission)
     if 'contact_form_token' not in session:
-        import secrets
-        session['contact_form_token'] = secrets.token_hex(16)
+        _rotate_contact_token()
     
     # Get subject from query parameter (for donation banner)
     subject_param = request.args.get('subject', '')
@@ -185,27 +160,29 @@ def contact():
 def confirm_email(token):
     """Confirm user email with token from welcome email"""
     from app.models import User
-    from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+    from itsdangerous import BadSignature, SignatureExpired
     
     try:
-        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+        serializer = current_app.extensions['email_serializer']
         email = serializer.loads(
             token,
-            salt=current_app.config.get('SECURITY_PASSWORD_SALT', 'tarracograf-salt-2024'),
             max_age=86400 * 7  # Token válido por 7 días
         )
         
-        user = User.query.filter_by(email=email).first_or_404()
+        # Solo id + confirmed_at: el caso habitual (ya confirmado) no hidrata el User
+        user = db.session.query(User.id, User.confirmed_at).filter_by(email=email).first()
+        if user is None:
+            abort(404)
         
         if user.confirmed_at:
             flash(_('El teu correu electrònic ja està confirmat.'), 'info')
             return redirect(url_for('security.login'))
         
-        # Confirm user
-        user.confirmed_at = datetime.utcnow()
+        # Confirm user (UPDATE directo, sin cargar la fila completa)
+        User.query.filter_by(id=user.id).update({'confirmed_at': datetime.utcnow()})
         db.session.commit()
         
-        current_app.logger.info(f'User {user.id} ({user.email}) confirmed email via token')
+        current_app.logger.info(f'User {user.id} ({email}) confirmed email via token')
         flash(_('Correu electrònic confirmat correctament! Ja pots iniciar sessió.'), 'success')
         return redirect(url_for('security.login'))
         
@@ -222,8 +199,6 @@ def confirm_email(token):
 
 @bp.route('/set_language/<lang>')
 def set_language(lang):
-    from flask import current_app
-    
     if lang in current_app.config['BABEL_SUPPORTED_LOCALES']:
         session['language'] = lang
         session.permanent = True
@@ -5,15 +5,96 @@ Uses provider pattern for flexible email delivery (SMTP, Console)
 Uses Celery for asynchronous email sending when available
 """
 import os
-from flask import render_template, current_app, url_for
+from flask import current_app, url_for, has_app_context, has_request_context
 from flask_babel import gettext as _
 from app.container import provide
-from app.providers.base import EmailProvider
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from app.providers.base import EmailProvider
 
+def _detect_staging(app):
+    """Staging detection from env vars and the app config"""
+    # Check Railway environment variable
+    railway_env = os.environ.get('RAILWAY_ENVIRONMENT', '').lower()
+    if railway_env == 'staging':
+        return True
+    
+    # Check Railway service name (often contains 'staging')
+    railway_service = os.environ.get('RAILWAY_SERVICE_NAME', '').lower()
+    if 'staging' in railway_service:
+        return True
+    
+    # Check FLASK_ENV
+    flask_env = os.environ.get('FLASK_ENV', '').lower()
+    if flask_env == 'staging':
+        return True
+    
+    # Check app config ENV
+    if app.config.get('ENV', 'development').lower() == 'staging':
+        return True
+    
+    return False
+
+
+def _build_base_ctx_kwargs(app):
+    """Kwargs for test_request_context built from BASE_URL"""
+    base_url = os.environ.get('BASE_URL') or app.config.get('BASE_URL')
+    if not base_url:
+        # Last resort: test_request_context with defaults
+        return {}
+    from urllib.parse import urlparse
+    parsed = urlparse(base_url)
+    return {
+        'base_url': base_url,
+        'environ_base': {'SERVER_NAME': parsed.netloc or 'localhost:5000'},
+    }
+
+
+def init_email_settings(app):
+    """Compute the per-app email settings once (called from create_app, after the config is loaded)"""
+    app.extensions['email_is_staging'] = _detect_staging(app)
+    app.extensions['email_base_ctx_kwargs'] = _build_base_ctx_kwargs(app)
+
+
+def _email_setting(name):
+    """Read a setting stored by init_email_settings, computing it for apps created without it"""
+    if name not in current_app.extensions:
+        init_email_settings(current_app)
+    return current_app.extensions[name]
+
+
+# Plantillas de email ya resueltas por nombre (evita get_or_select_template en cada envío)
+_EMAIL_TEMPLATE_CACHE = {}
+
+
+def _render_email_template(template, **kwargs):
+    """Render emails/<template>.html reusing the compiled Jinja template"""
+    jinja_template = _EMAIL_TEMPLATE_CACHE.get(template)
+    if jinja_template is None:
+        jinja_template = current_app.jinja_env.get_template(f'emails/{template}.html')
+        # En debug (auto_reload) no se fija: así los cambios en la plantilla se siguen viendo
+        if not current_app.jinja_env.auto_reload:
+            _EMAIL_TEMPLATE_CACHE[template] = jinja_template
+    # Mismo contexto que render_template (context processors: _, url_for, etc.)
+    current_app.update_template_context(kwargs)
+    return jinja_template.render(kwargs)
+
+
+def warm_email_templates():
+    """Compile every emails/*.html template up front (called once in the Celery worker,
+    before forking, so all the pool processes start with the templates compiled)"""
+    if current_app.jinja_env.auto_reload:
+        return 0
+    names = current_app.jinja_env.list_templates(
+        filter_func=lambda name: name.startswith('emails/') and name.endswith('.html')
+    )
+    for name in names:
+        template = name[len('emails/'):-len('.html')]
+        if template not in _EMAIL_TEMPLATE_CACHE:
+            _EMAIL_TEMPLATE_CACHE[template] = current_app.jinja_env.get_template(name)
+    return len(names)
+
 
 class EmailService:
     """Service for sending emails with Tarracograf branding"""
@@ -21,35 +102,21 @@ class EmailService:
     @staticmethod
     def _is_staging():
         """Check if we're in staging environment"""
-        # Check Railway environment variable
-        railway_env = os.environ.get('RAILWAY_ENVIRONMENT', '').lower()
-        if railway_env == 'staging':
-            return True
-        
-        # Check Railway service name (often contains 'staging')
-        railway_service = os.environ.get('RAILWAY_SERVICE_NAME', '').lower()
-        if 'staging' in railway_service:
-            return True
-        
-        # Check FLASK_ENV
-        flask_env = os.environ.get('FLASK_ENV', '').lower()
-        if flask_env == 'staging':
-            return True
-        
-        # Check app config ENV
-        try:
-            app_env = current_app.config.get('ENV', 'development').lower()
-            if app_env == 'staging':
-                return True
-        except:
-            pass
-        
-        return False
+        if not has_app_context():
+            return False
+        return _email_setting('email_is_staging')
     
     @staticmethod
-    def _add_staging_prefix(subject):
+    def _suppressed():
+        """MAIL_SUPPRESS_SEND: skip the whole send path (no enqueue, no template rendering)"""
+        return current_app.config.get('MAIL_SUPPRESS_SEND', False)
+    
+    @staticmethod
+    def _add_staging_prefix(subject, is_staging=None):
         """Add staging prefix to email subject if in staging"""
-        if EmailService._is_staging():
+        if is_staging is None:
+            is_staging = EmailService._is_staging()
+        if is_staging:
             return f"[STAGING] {subject}"
         return subject
     
@@ -59,6 +126,10 @@ class EmailService:
         Send an email directly using the provider (without Celery).
         Used when Celery is disabled or when called from within a Celery task.
         """
+        if EmailService._suppressed():
+            current_app.logger.info(f'[EMAIL SUPPRESSED] To: {to}, Subject: {subject}')
+            return True
+        
         # Render the email template
         # Flask can generate external URLs without request context if SERVER_NAME is configured
         # If not configured, we'll create a minimal request context
@@ -66,24 +137,12 @@ class EmailService:
             # Check if SERVER_NAME is configured (standard Flask way)
             if current_app.config.get('SERVER_NAME'):
                 # Flask can generate external URLs directly
-                html = render_template(f'emails/{template}.html', **kwargs)
+                html = _render_email_template(template, **kwargs)
             else:
                 # Fallback: create a minimal request context
                 # Extract domain from BASE_URL if available, otherwise use default
-                base_url = os.environ.get('BASE_URL') or current_app.config.get('BASE_URL')
-                if base_url:
-                    # Parse BASE_URL to get scheme and host
-                    from urllib.parse import urlparse
-                    parsed = urlparse(base_url)
-                    with current_app.test_request_context(
-                        base_url=base_url,
-                        environ_base={'SERVER_NAME': parsed.netloc or 'localhost:5000'}
-                    ):
-                        html = render_template(f'emails/{template}.html', **kwargs)
-                else:
-                    # Last resort: use test_request_context with defaults
-                    with current_app.test_request_context():
-                        html = render_template(f'emails/{template}.html', **kwargs)
+                with current_app.test_request_context(**_email_setting('email_base_ctx_kwargs')):
+                    html = _render_email_template(template, **kwargs)
         except Exception as e:
             current_app.logger.error(f'Error rendering email template {template}: {str(e)}', exc_info=True)
             return False
@@ -96,10 +155,8 @@ class EmailService:
                 return False
             
             # Add staging prefix to subject if in staging
-            final_subject = EmailService._add_staging_prefix(subject)
-            
-            # Add staging indicator to email context
-            kwargs['is_staging'] = EmailService._is_staging()
+            # (send_email already put the flag in kwargs)
+            final_subject = EmailService._add_staging_prefix(subject, kwargs.get('is_staging'))
             
             # Send email via provider
             result = provider.send_email(to, final_subject, html)
@@ -119,6 +176,11 @@ class EmailService:
             template: Template name (without .html)
             **kwargs: Additional context variables for the template
         """
+        # Tests: no broker round-trip nor template rendering
+        if EmailService._suppressed():
+            current_app.logger.info(f'[EMAIL SUPPRESSED] To: {to}, Subject: {subject}')
+            return True
+        
         # Add staging indicator to kwargs
         kwargs['is_staging'] = EmailService._is_staging()
         
@@ -135,27 +197,82 @@ class EmailService:
             current_app.logger.warning('Celery task not available, falling back to direct send')
             return EmailService._send_email_direct(to, subject, template, **kwargs)
         
+        # Large recipient lists: one task per chunk so a worker (and its retries)
+        # only holds a bounded slice of recipients
+        chunk_size = current_app.config.get('MAIL_RECIPIENT_CHUNK_SIZE', 20)
+        if isinstance(to, (list, tuple)) and chunk_size and len(to) > chunk_size:
+            from celery import group
+            group(
+                send_email_task.s(list(to[i:i + chunk_size]), subject, template, **kwargs)
+                for i in range(0, len(to), chunk_size)
+            ).apply_async()
+            current_app.logger.info(
+                f'Email tasks enqueued to {len(to)} recipients in chunks of {chunk_size}: {subject}'
+            )
+            return True
+        
         # Enqueue email task (kwargs should already be JSON-serializable)
         # Note: staging prefix will be added in _send_email_direct
         task = send_email_task.delay(to, subject, template, **kwargs)
-        current_app.logger.info(f'Email task enqueued to {to}: {subject} (task_id: {task.id})')
+        current_app.logger.info('Email task enqueued to %s: %s (task_id: %s)', to, subject, task.id)
         return True
     
+    @staticmethod
+    def send_emails_bulk(messages):
+        """
+        Send several emails at once. With Celery, all tasks are published as one
+        group (a single producer/connection) instead of one .delay() per email.
+        
+        Args:
+            messages: iterable of (to, subject, template, context_dict)
+        
+        Returns:
+            Number of emails enqueued (or sent successfully when Celery is not used)
+        """
+        messages = list(messages)
+        if not messages:
+            return 0
+        
+        if EmailService._suppressed():
+            for to, subject, _template, _context in messages:
+                current_app.logger.info(f'[EMAIL SUPPRESSED] To: {to}, Subject: {subject}')
+            return len(messages)
+        
+        is_staging = EmailService._is_staging()
+        use_celery = current_app.config.get('USE_CELERY_FOR_EMAILS', True)
+        send_email_task = getattr(current_app, 'send_email_task', None) if use_celery else None
+        
+        if not send_email_task:
+            if use_celery:
+                current_app.logger.warning('Celery task not available, falling back to direct send')
+            sent = 0
+            for to, subject, template, context in messages:
+                if EmailService._send_email_direct(to, subject, template, **dict(context, is_staging=is_staging)):
+                    sent += 1
+            return sent
+        
+        from celery import group
+        group(
+            send_email_task.s(to, subject, template, **dict(context, is_staging=is_staging))
+            for to, subject, template, context in messages
+        ).apply_async()
+        current_app.logger.info(f'{len(messages)} email tasks enqueued as a group')
+        return len(messages)
+    
     @staticmethod
     def send_welcome_email(user):
         """Send welcome email after registration with confirmation link"""
-        try:
+        # url_for(_external=True) only works with a request context or SERVER_NAME
+        login_url = None
+        if has_request_context() or current_app.config.get('SERVER_NAME'):
             login_url = url_for('security.login', _external=True)
-        except:
-            login_url = None
         
         # Generate confirmation token if user is not confirmed
         confirmation_url = None
         if not user.confirmed_at:
             try:
-                from itsdangerous import URLSafeTimedSerializer
-                serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-                token = serializer.dumps(user.email, salt=current_app.config.get('SECURITY_PASSWORD_SALT', 'tarracograf-salt-2024'))
+                serializer = current_app.extensions['email_serializer']
+                token = serializer.dumps(user.email)
                 confirmation_url = url_for('main.confirm_email', token=token, _external=True)
             except Exception as e:
                 current_app.logger.error(f'Error generating confirmation token: {str(e)}', exc_info=True)
@@ -178,14 +295,15 @@ class EmailService:
             current_app.logger.warning('No email address for donation confirmation')
             return False
         
+        completed_at = getattr(donation, 'completed_at', None)
         return EmailService.send_email(
             to=recipient,
             subject=_('Gràcies per la teva donació! 💚'),
             template='donation_confirmation',
             username=user.username if user else None,
             user_email=user.email if user else None,
-            amount=donation.amount_euros if hasattr(donation, 'amount_euros') else None,
-            donation_date=donation.completed_at.strftime('%d/%m/%Y %H:%M') if hasattr(donation, 'completed_at') and donation.completed_at else None
+            amount=getattr(donation, 'amount_euros', None),
+            donation_date=completed_at.strftime('%d/%m/%Y %H:%M') if completed_at else None
         )
     
     @staticmethod
@@ -223,40 +341,40 @@ class EmailService:
     @staticmethod
     def send_initiative_reminder(initiative, user):
         """Send reminder email before initiative date"""
-        try:
-            initiative_url = url_for('initiatives.detail', id=initiative.id, _external=True)
-        except Exception:
-            initiative_url = None
         return EmailService.send_email(
             to=user.email,
             subject=_('Recordatori: La teva iniciativa és demà! 📅'),
             template='initiative_reminder',
             username=user.username or user.email,
             user_email=user.email,
-            initiative_title=initiative.title,
-            initiative_date=initiative.date.strftime('%d/%m/%Y') if initiative.date else None,
-            initiative_time=str(initiative.time) if hasattr(initiative, 'time') and initiative.time else None,
-            initiative_location=initiative.location,
-            initiative_url=initiative_url
+            **EmailService._initiative_email_context(initiative)
         )
     
     @staticmethod
-    def send_participant_confirmation(initiative, participant_email, participant_name=None):
-        """Send confirmation email to initiative participant"""
+    def _initiative_email_context(initiative):
+        """Common initiative fields for participant emails (URL and formatted date/time)"""
         try:
             initiative_url = url_for('initiatives.detail', id=initiative.id, _external=True)
         except Exception:
             initiative_url = None
+        initiative_time = getattr(initiative, 'time', None)
+        return {
+            'initiative_title': initiative.title,
+            'initiative_date': initiative.date.strftime('%d/%m/%Y') if initiative.date else None,
+            'initiative_time': str(initiative_time) if initiative_time else None,
+            'initiative_location': initiative.location,
+            'initiative_url': initiative_url,
+        }
+    
+    @staticmethod
+    def send_participant_confirmation(initiative, participant_email, participant_name=None):
+        """Send confirmation email to initiative participant"""
         return EmailService.send_email(
             to=participant_email,
             subject=_('Confirmació de participació en iniciativa'),
             template='participant_confirmation',
-            initiative_title=initiative.title,
-            initiative_date=initiative.date.strftime('%d/%m/%Y') if initiative.date else None,
-            initiative_time=str(initiative.time) if hasattr(initiative, 'time') and initiative.time else None,
-            initiative_location=initiative.location,
             participant_name=participant_name,
-            initiative_url=initiative_url
+            **EmailService._initiative_email_context(initiative)
         )
     
     @staticmethod
@@ -349,33 +467,78 @@ class EmailService:
         )
     
     @staticmethod
-    def send_contact_form_response(contact_email, subject, message):
-        """Send response to contact form submission"""
-        return EmailService.send_email(
-            to=contact_email,
-            subject=_('Gràcies per contactar amb Tarracograf'),
-            template='contact_response',
-            contact_email=contact_email,
-            contact_subject=subject,  # Renamed to avoid conflict with email subject
-            message=message
+    def _contact_form_response_message(contact_email, subject, message):
+        """(to, subject, template, context) of the contact form confirmation"""
+        return (
+            contact_email,
+            _('Gràcies per contactar amb Tarracograf'),
+            'contact_response',
+            {
+                'contact_email': contact_email,
+                'contact_subject': subject,  # Renamed to avoid conflict with email subject
+                'message': message,
+            }
         )
     
     @staticmethod
-    def send_admin_notification(admin_email, notification_type, data):
-        """Send notification to admin"""
+    def _admin_notification_message(admin_email, notification_type, data):
+        """(to, subject, template, context) of an admin notification"""
         # Create a more descriptive subject based on notification type
         subject = f"Tarracograf - {notification_type}"
         if data.get('subject'):
             subject = f"Tarracograf - {notification_type}: {data.get('subject')}"
+        return (
+            admin_email,
+            subject,
+            'admin_notification',
+            {'notification_type': notification_type, 'data': data}
+        )
+    
+    @staticmethod
+    def send_contact_form_response(contact_email, subject, message):
+        """Send response to contact form submission"""
+        to, email_subject, template, context = EmailService._contact_form_response_message(
+            contact_email, subject, message
+        )
+        return EmailService.send_email(to, email_subject, template, **context)
+    
+    @staticmethod
+    def send_contact_form_emails(name, email, subject, message, phone=None):
+        """Send both contact form emails: confirmation to the sender (unless it is
+        the admin address) and notification to the admin, enqueued together.
+        Errors are logged, never raised"""
+        admin_email = current_app.config.get('ADMIN_EMAIL', 'hola@tarracograf.cat')
+        messages = []
+        if email and (not admin_email or email.lower() != admin_email.lower()):
+            messages.append(EmailService._contact_form_response_message(email, subject, message))
+        if admin_email:
+            current_app.logger.info(f'Sending admin notification: Nou missatge de contacte to {admin_email}')
+            messages.append(EmailService._admin_notification_message(
+                admin_email,
+                'Nou missatge de contacte',
+                {
+                    'name': name,
+                    'email': email,
+                    'subject': subject,
+                    'message': message,
+                    'phone': phone if phone else 'No proporcionat'
+                }
+            ))
         
-        current_app.logger.info(f'Sending admin notification: {notification_type} to {admin_email}')
-        result = EmailService.send_email(
-            to=admin_email,
-            subject=subject,
-            template='admin_notification',
-            notification_type=notification_type,
-            data=data
+        try:
+            EmailService.send_emails_bulk(messages)
+        except Exception as e:
+            current_app.logger.error(f'Error sending contact form emails: {str(e)}', exc_info=True)
+    
+    @staticmethod
+    def send_admin_notification(admin_email, notification_type, data):
+        """Send notification to admin"""
+        to, subject, template, context = EmailService._admin_notification_message(
+            admin_email, notification_type, data
         )
+        
+        current_app.logger.info(f'Sending admin notification: {notification_type} to {admin_email}')
+        result = EmailService.send_email(to, subject, template, **context)
         if result:
             current_app.logger.info(f'Admin notification sent successfully to {admin_email}')
         else:
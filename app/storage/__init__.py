@@ -1,3 +1,5 @@
+import logging
+
 from flask import current_app
 
 from app.storage.local import LocalStorageProvider
@@ -6,21 +8,29 @@ from app.storage.bunny import BunnyStorageProvider
 # Key for storing storage provider in Flask app extensions
 _STORAGE_EXTENSION_KEY = 'storage_provider'
 
+# STORAGE_PROVIDER -> provider class (unknown values fall back to local)
+_PROVIDERS = {
+    'local': LocalStorageProvider,
+    'bunny': BunnyStorageProvider,
+}
+
 
 def get_storage():
     """
     Return storage provider based on configuration (singleton per app).
     The provider is cached in current_app.extensions to avoid recreating it.
     """
-    # Check if we already have a cached instance
-    if _STORAGE_EXTENSION_KEY in current_app.extensions:
-        return current_app.extensions[_STORAGE_EXTENSION_KEY]
+    # Check if we already have a cached instance (single dict lookup on the hot path)
+    storage_instance = current_app.extensions.get(_STORAGE_EXTENSION_KEY)
+    if storage_instance is not None:
+        return storage_instance
     
     # Create new instance (only once per app)
     provider = current_app.config.get('STORAGE_PROVIDER', 'local').lower()
     current_app.logger.info(f'📦 Storage provider requested: {provider} (creating new instance)')
     
-    if provider == 'bunny':
+    provider_class = _PROVIDERS.get(provider, LocalStorageProvider)
+    if provider_class is BunnyStorageProvider and current_app.logger.isEnabledFor(logging.INFO):
         bunny_config = {
             'BUNNY_STORAGE_ZONE': current_app.config.get('BUNNY_STORAGE_ZONE'),
             'BUNNY_STORAGE_API_KEY': '***' if current_app.config.get('BUNNY_STORAGE_API_KEY') else None,
@@ -28,10 +38,9 @@ def get_storage():
             'BUNNY_STORAGE_REGION': current_app.config.get('BUNNY_STORAGE_REGION'),
         }
         current_app.logger.info(f'🔧 BunnyCDN config: {bunny_config}')
-        storage_instance = BunnyStorageProvider(current_app.config)
-    else:
+    elif provider_class is LocalStorageProvider:
         current_app.logger.info('📁 Using LocalStorageProvider')
-        storage_instance = LocalStorageProvider(current_app.config)
+    storage_instance = provider_class(current_app.config)
     
     # Cache the instance in app extensions (singleton)
     current_app.extensions[_STORAGE_EXTENSION_KEY] = storage_instance
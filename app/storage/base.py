@@ -1,6 +1,21 @@
 """Base storage provider interface."""
 
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+# Executor compartido por todos los providers para save_async (creado al primer uso)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='storage')
+    return _executor
 
 
 class StorageProvider(ABC):
@@ -16,3 +31,27 @@ class StorageProvider(ABC):
         """Return public (or signed) URL for key."""
         raise NotImplementedError
 
+    def save_many(self, items) -> dict:
+        """Save several files. items: iterable of (key, file_path, delete_after_upload).
+        Returns {key: None on success | exception}. Sequential by default."""
+        errors = {}
+        for key, file_path, delete_after_upload in items:
+            try:
+                self.save(key, file_path, delete_after_upload=delete_after_upload)
+                errors[key] = None
+            except Exception as e:
+                errors[key] = e
+        return errors
+
+    def save_async(self, key: str, file_path: str, delete_after_upload: bool = False):
+        """Run save() on the shared storage executor. Returns a concurrent.futures.Future
+        (result() re-raises the upload error), so the caller can keep working meanwhile."""
+        from flask import current_app
+        app = current_app._get_current_object()
+
+        def run():
+            # save() usa current_app: el hilo necesita su app context
+            with app.app_context():
+                return self.save(key, file_path, delete_after_upload=delete_after_upload)
+
+        return _get_executor().submit(run)
@@ -1,20 +1,22 @@
+import logging
 import os
+from urllib.parse import urlencode
+
 import requests
+import requests.adapters
+from urllib3.util.retry import Retry
 from app.storage.base import StorageProvider
 
 
 class BunnyStorageProvider(StorageProvider):
     """BunnyCDN storage provider."""
 
+    # Subidas simultáneas en save_many (BunnyCDN admite muchas más conexiones por zona)
+    MAX_PARALLEL_UPLOADS = 16
+
     def __init__(self, config):
         from flask import current_app
         
-        # Debug: Log available environment variables
-        bunny_env_vars = {k: '***' if 'KEY' in k or 'PASSWORD' in k else v 
-                         for k, v in os.environ.items() 
-                         if any(x in k.upper() for x in ['BUNNY', 'CDN'])}
-        current_app.logger.info(f'🔍 Available BunnyCDN-related env vars: {list(bunny_env_vars.keys())}')
-        
         # Recuperación de Configuración
         self.storage_zone = config.get('BUNNY_STORAGE_ZONE') or os.environ.get('BUNNY_STORAGE_ZONE', '')
         current_app.logger.debug(
@@ -38,6 +40,15 @@ class BunnyStorageProvider(StorageProvider):
             f'final: {self.pull_zone}'
         )
         
+        # Host del pull zone normalizado una sola vez (url_for se llama por cada imagen).
+        # Acepta tanto 'tarracograf-cat.b-cdn.net' como 'https://tarracograf-cat.b-cdn.net'
+        # o solo el nombre corto de la zona ('tarracograf-cat' -> sufijo .b-cdn.net)
+        pull_zone_host = (self.pull_zone or '').strip()
+        pull_zone_host = pull_zone_host.removeprefix('https://').removeprefix('http://').rstrip('/')
+        if pull_zone_host and '.' not in pull_zone_host:
+            pull_zone_host = f'{pull_zone_host}.b-cdn.net'
+        self._pull_zone_host = pull_zone_host
+        
         # Región del storage (opcional, por defecto usa el endpoint principal)
         # Regiones disponibles: de (Falkenstein), ny (New York), la (Los Angeles), 
         # sg (Singapore), syd (Sydney), uk (London), se (Stockholm), br (São Paulo)
@@ -62,8 +73,26 @@ class BunnyStorageProvider(StorageProvider):
             current_app.logger.error('❌ BUNNY_PULL_ZONE not configured!')
             raise ValueError('BUNNY_PULL_ZONE is required. Please set BUNNY_PULL_ZONE environment variable.')
         
-        # Session para reutilizar conexiones HTTP
+        # exists() prueba HEAD; pasa a GET con rango si la API no lo admite (405)
+        self._head_supported = True
+        
+        # Session para reutilizar conexiones HTTP (pool dimensionado para save_many)
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.MAX_PARALLEL_UPLOADS,
+            pool_maxsize=self.MAX_PARALLEL_UPLOADS * 2,
+            # Reintentos con backoff ante saturación/errores transitorios del Storage API.
+            # PUT no se reintenta aquí: el cuerpo es un archivo en streaming ya consumido
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 502, 503, 504),
+                allowed_methods=frozenset({'HEAD', 'GET', 'DELETE'}),
+                respect_retry_after_header=True,
+            ),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'AccessKey': self.storage_api_key,
         })
@@ -92,11 +121,12 @@ class BunnyStorageProvider(StorageProvider):
         # Normalize key (remove leading slash)
         normalized_key = key.lstrip('/')
         
-        current_app.logger.info(
-            f'☁️ BunnyStorage.save: key={normalized_key}, file_path={file_path}, '
-            f'file_exists={os.path.exists(file_path) if file_path else False}, '
-            f'delete_after_upload={delete_after_upload}'
-        )
+        logger = current_app.logger
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'☁️ BunnyStorage.save: key={normalized_key}, file_path={file_path}, '
+                f'delete_after_upload={delete_after_upload}'
+            )
         
         if not os.path.exists(file_path):
             current_app.logger.error(f'❌ BunnyStorage.save: File not found: {file_path}')
@@ -106,39 +136,33 @@ class BunnyStorageProvider(StorageProvider):
             # Construir URL del Storage API
             upload_url = f'{self.storage_endpoint}/{normalized_key}'
             
-            current_app.logger.debug(f'📤 BunnyStorage: Uploading to {upload_url}')
-            
             # Detectar Content-Type basado en extensión
             import mimetypes
             content_type, _ = mimetypes.guess_type(file_path)
             if not content_type:
                 content_type = 'application/octet-stream'
             
-            # Leer archivo
+            # Upload a BunnyCDN Storage usando PUT, enviando el archivo en streaming
+            # (requests lo lee por bloques; Content-Length explícito evita chunked encoding)
             with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            # Upload a BunnyCDN Storage usando PUT
-            response = self.session.put(
-                upload_url,
-                data=file_data,
-                headers={'Content-Type': content_type},
-                timeout=60
-            )
+                response = self.session.put(
+                    upload_url,
+                    data=f,
+                    headers={
+                        'Content-Type': content_type,
+                        'Content-Length': str(os.fstat(f.fileno()).st_size),
+                    },
+                    timeout=(10, 300)
+                )
             
             if response.status_code == 201:
-                current_app.logger.info(
-                    f'✅ BunnyStorage: Successfully uploaded {normalized_key} '
-                    f'to {self.storage_zone}/{normalized_key}'
-                )
+                logger.debug('✅ BunnyStorage: Successfully uploaded %s', normalized_key)
                 
                 # Delete local file after successful upload if requested
                 if delete_after_upload:
                     try:
                         os.remove(file_path)
-                        current_app.logger.info(
-                            f'🗑️ BunnyStorage: Deleted local file after upload: {file_path}'
-                        )
+                        logger.debug('🗑️ BunnyStorage: Deleted local file after upload: %s', file_path)
                     except Exception as e:
                         current_app.logger.warning(
                             f'⚠️ BunnyStorage: Could not delete local file {file_path}: {e}'
@@ -163,6 +187,38 @@ class BunnyStorageProvider(StorageProvider):
         
         return normalized_key
 
+    def save_many(self, items) -> dict:
+        """
+        Upload several files to BunnyCDN Storage in parallel.
+        
+        Args:
+            items: iterable of (key, file_path, delete_after_upload)
+        
+        Returns:
+            {key: None on success | exception}
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from flask import current_app
+        
+        items = list(items)
+        if len(items) <= 1:
+            return super().save_many(items)
+        
+        app = current_app._get_current_object()
+        
+        def save_one(item):
+            key, file_path, delete_after_upload = item
+            # save() usa current_app: cada hilo necesita su app context
+            with app.app_context():
+                self.save(key, file_path, delete_after_upload=delete_after_upload)
+        
+        errors = {}
+        with ThreadPoolExecutor(max_workers=min(self.MAX_PARALLEL_UPLOADS, len(items))) as executor:
+            futures = [(item[0], executor.submit(save_one, item)) for item in items]
+            for key, future in futures:
+                errors[key] = future.exception()
+        return errors
+
     def url_for(self, key: str, expires_in: int = 604800) -> str:
         """
         Generate a public CDN URL for accessing the object.
@@ -177,30 +233,8 @@ class BunnyStorageProvider(StorageProvider):
         Returns:
             Public CDN URL (e.g., 'https://your-pull-zone.b-cdn.net/images/user123/photo.jpg')
         """
-        from flask import current_app
-        
-        # Normalize key (remove leading slash)
-        normalized_key = key.lstrip('/')
-        
-        # Normalizar pull zone (puede venir con o sin protocolo)
-        pull_zone = (self.pull_zone or '').strip()
-        # Aceptar tanto 'tarracograf-cat.b-cdn.net' como 'https://tarracograf-cat.b-cdn.net'
-        if pull_zone.startswith('https://'):
-            pull_zone = pull_zone[len('https://') :]
-        elif pull_zone.startswith('http://'):
-            pull_zone = pull_zone[len('http://') :]
-        pull_zone = pull_zone.rstrip('/')  # quitar slash final si lo hay
-        # Si el usuario ha puesto solo el nombre corto de la zona (ej: 'tarracograf-cat'),
-        # añadir el sufijo por defecto de BunnyCDN (.b-cdn.net)
-        if pull_zone and '.' not in pull_zone:
-            pull_zone = f'{pull_zone}.b-cdn.net'
-        
-        # Construir URL pública del CDN
         # BunnyCDN URLs son públicas por defecto, no necesitan firma
-        cdn_url = f'https://{pull_zone}/{normalized_key}'
-        
-        current_app.logger.debug(f'🔗 BunnyStorage.url_for: Generated CDN URL for {normalized_key}')
-        current_app.logger.debug(f'🔗 Full CDN URL: {cdn_url}')
+        cdn_url = f"https://{self._pull_zone_host}/{key.lstrip('/')}"
         
         return cdn_url
     
@@ -229,37 +263,14 @@ class BunnyStorageProvider(StorageProvider):
             url_for_resized('images/photo.jpg', width=400, height=300, format='webp')
             # https://your-pull-zone.b-cdn.net/images/photo.jpg?width=400&height=300&format=webp
         """
-        from flask import current_app
-        
         # Obtener URL base
         base_url = self.url_for(key)
         
-        # Construir parámetros de transformación
-        params = []
-        
-        if width:
-            params.append(f'width={width}')
-        if height:
-            params.append(f'height={height}')
-        if quality:
-            params.append(f'quality={quality}')
-        if format:
-            params.append(f'format={format}')
-        
-        # Parámetros adicionales
-        for param_key, param_value in kwargs.items():
-            params.append(f'{param_key}={param_value}')
+        # Parámetros de transformación (URL-encoded; se omiten los no indicados)
+        params = {'width': width, 'height': height, 'quality': quality, 'format': format, **kwargs}
+        query = urlencode({k: v for k, v in params.items() if v is not None})
         
-        if params:
-            transformed_url = f"{base_url}?{'&'.join(params)}"
-        else:
-            transformed_url = base_url
-        
-        current_app.logger.debug(
-            f'🎨 BunnyStorage.url_for_resized: Generated transformed URL with params: {params}'
-        )
-        
-        return transformed_url
+        return f'{base_url}?{query}' if query else base_url
     
     def delete(self, key: str) -> bool:
         """
@@ -315,20 +326,25 @@ class BunnyStorageProvider(StorageProvider):
         normalized_key = key.lstrip('/')
         
         try:
-            # BunnyCDN no tiene un HEAD directo, usamos GET con rango 0-0
             check_url = f'{self.storage_endpoint}/{normalized_key}'
             
-            response = self.session.get(
-                check_url,
-                headers={'Range': 'bytes=0-0'},
-                timeout=10
-            )
+            # HEAD (sin cuerpo); si la API responde 405 se recuerda y se usa GET con rango 0-0
+            response = None
+            if self._head_supported:
+                response = self.session.head(check_url, timeout=10)
+                if response.status_code == 405:
+                    self._head_supported = False
+                    response = None
+            if response is None:
+                response = self.session.get(
+                    check_url,
+                    headers={'Range': 'bytes=0-0'},
+                    timeout=10
+                )
             
             exists = response.status_code in [200, 206]
             
-            current_app.logger.debug(
-                f'🔍 BunnyStorage.exists: {normalized_key} exists={exists}'
-            )
+            current_app.logger.debug('🔍 BunnyStorage.exists: %s exists=%s', normalized_key, exists)
             
             return exists
             
@@ -7,7 +7,7 @@ from flask import current_app
 def init_tasks(celery_app):
     """Initialize Celery tasks with the Celery app instance"""
     
-    @celery_app.task(name='send_email_task', bind=True, max_retries=3)
+    @celery_app.task(name='send_email_task', bind=True, acks_late=True, max_retries=3, serializer='orjson')
     def send_email_task(self, to, subject, template, **kwargs):
         """
         Celery task to send an email asynchronously using EmailService
@@ -22,24 +22,16 @@ def init_tasks(celery_app):
             # Import here to avoid circular imports
             from app.services.email_service import EmailService
             
-            # Temporarily disable Celery to avoid infinite recursion
-            original_use_celery = current_app.config.get('USE_CELERY_FOR_EMAILS', True)
-            current_app.config['USE_CELERY_FOR_EMAILS'] = False
+            # Send directly through the provider (we're already in a task).
+            # kwargs should already be JSON-serializable (only primitives)
+            result = EmailService._send_email_direct(to, subject, template, **kwargs)
             
-            try:
-                # Use EmailService to send email (synchronously since we're already in a task)
-                # kwargs should already be JSON-serializable (only primitives)
-                result = EmailService.send_email(to, subject, template, **kwargs)
-                
-                if result:
-                    current_app.logger.info(f'Email sent successfully via Celery to {to}: {subject}')
-                else:
-                    current_app.logger.warning(f'Email sending failed via Celery to {to}: {subject}')
-                
-                return result
-            finally:
-                # Restore original setting
-                current_app.config['USE_CELERY_FOR_EMAILS'] = original_use_celery
+            if result:
+                current_app.logger.info('Email sent successfully via Celery to %s: %s', to, subject)
+            else:
+                current_app.logger.warning(f'Email sending failed via Celery to {to}: {subject}')
+            
+            return result
                 
         except Exception as exc:
             current_app.logger.error(f'Error sending email via Celery to {to}: {str(exc)}', exc_info=True)
@@ -10,7 +10,7 @@ def init_image_tasks(celery_app):
     @celery_app.task(name='resize_image_task', bind=True, max_retries=3)
     def resize_image_task(self, item_id, image_filename):
         """
-        Celery task to resize an uploaded image into multiple sizes
+        Celery task to optimize an uploaded image and resize it into multiple sizes
         
         Args:
             item_id: ID of the InventoryItem
@@ -21,7 +21,7 @@ def init_image_tasks(celery_app):
             f'task_id={self.request.id if hasattr(self.request, "id") else "N/A"}'
         )
         try:
-            from app.utils import generate_image_sizes
+            from app.utils import generate_image_sizes, optimize_image
             from app.extensions import db
             from app.models import InventoryItem
             from app.storage import get_storage
@@ -46,6 +46,11 @@ def init_image_tasks(celery_app):
                     current_app.logger.error(f'Image file not found: {original_path}')
                     return False
             
+            # Basic optimization of the original (moved out of the web request).
+            # Only on the first attempt: re-encoding on every retry would degrade the image
+            if self.request.retries == 0:
+                optimize_image(original_path)
+            
             # Generate image sizes
             current_app.logger.info(f'🖼️ Generating image sizes for item {item_id}: {image_filename}')
             image_sizes = generate_image_sizes(original_path, image_filename)
@@ -72,17 +77,24 @@ def init_image_tasks(celery_app):
                 f'(provider={storage_provider}, delete_after_upload={delete_after})'
             )
             
+            # Todas las versiones en un solo save_many (BunnyCDN las sube en paralelo)
+            uploads = {}
             for size_name, fname in image_sizes.items():
                 if not fname:
                     continue
                 path = os.path.join(upload_folder, fname)
                 if os.path.exists(path):
-                    try:
-                        current_app.logger.info(f'  📤 Uploading {size_name}: {fname}')
-                        storage.save(fname, path, delete_after_upload=delete_after)
-                        current_app.logger.info(f'  ✅ Uploaded {size_name}: {fname}')
-                    except Exception as e:
-                        current_app.logger.error(f'  ❌ Error uploading {size_name} {fname}: {e}', exc_info=True)
+                    uploads[fname] = size_name
+            
+            upload_errors = storage.save_many(
+                (fname, os.path.join(upload_folder, fname), delete_after) for fname in uploads
+            )
+            for fname, error in upload_errors.items():
+                size_name = uploads.get(fname)
+                if error is None:
+                    current_app.logger.info(f'  ✅ Uploaded {size_name}: {fname}')
+                else:
+                    current_app.logger.error(f'  ❌ Error uploading {size_name} {fname}: {error}', exc_info=error)
             
             
             current_app.logger.info(
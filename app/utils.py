@@ -1,8 +1,11 @@
 import os
 import re
+import secrets
+import time
 from flask import session
 from PIL import Image
 import bleach
+import threading
 from app.extensions import db
 from app.config import Config
 
@@ -24,6 +27,12 @@ def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def unique_upload_filename(original_filename):
+    """Nombre seguro y único para un fichero subido: time_ns + 4 bytes aleatorios.
+    Evita colisiones entre subidas concurrentes en el mismo instante"""
+    from werkzeug.utils import secure_filename
+    return secure_filename(f"{time.time_ns()}_{secrets.token_hex(4)}_{original_filename}")
+
 def calculate_distance_km(lat1, lon1, lat2, lon2):
     """
     Calculate the distance between two GPS coordinates in kilometers using Haversine formula.
@@ -131,13 +140,17 @@ def _extract_gps_from_dict(gps_info, method):
         return None
 
 
-def extract_gps_from_image(file_path):
+def extract_gps_from_image(source):
     """
     Extrae coordenadas GPS de una imagen usando exifread (robusto para iOS).
     Si exifread falla, intenta con _getexif() de Pillow como fallback.
     
+    Acepta tanto una ruta como un stream binario (p.ej. ``file.stream`` de un
+    upload), de modo que se puede leer el EXIF antes de escribir nada a disco.
+    Los streams se rebobinan al terminar para poder guardarlos después.
+    
     Args:
-        file_path: Ruta a la imagen
+        source: Ruta a la imagen o stream binario con seek()
     
     Returns:
         Tupla (latitud, longitud) o (None, None) si no se encuentra
@@ -147,62 +160,80 @@ def extract_gps_from_image(file_path):
     
     logger = logging.getLogger(__name__)
     
-    # Validar archivo
-    path = Path(file_path)
-    if not path.exists():
-        logger.error(f"File not found: {file_path}")
-        return None, None
+    is_stream = hasattr(source, 'read')
+    if is_stream:
+        name = getattr(source, 'filename', None) or getattr(source, 'name', None) or 'upload'
+    else:
+        # Validar archivo
+        path = Path(source)
+        if not path.exists():
+            logger.error(f"File not found: {source}")
+            return None, None
+        name = path.name
     
-    logger.debug(f"Extracting GPS from image: {path.name}")
+    logger.debug(f"Extracting GPS from image: {name}")
     
     # === MÉTODO 1: Usar exifread (robusto para iOS) ===
     try:
         import exifread
         
-        # Abrir imagen en modo binario y procesar EXIF
-        with open(file_path, 'rb') as img_file:
-            tags = exifread.process_file(img_file, details=False)
-            
-            logger.debug(f"exifread returned {len(tags)} tags")
+        # Procesar EXIF en modo binario (stream en memoria o fichero en disco)
+        # stop_tag (nombre corto, sin el prefijo 'GPS ' del dict devuelto) deja de leer
+        # la IFD GPS tras GPSLongitude: los tags GPS van ordenados, así que Latitude(Ref)
+        # y LongitudeRef ya se han leído y se saltan altitud, timestamps, velocidad,
+        # dirección... Las demás IFDs se siguen leyendo. details=False evita MakerNotes
+        # y miniaturas
+        exif_options = {'stop_tag': 'GPSLongitude', 'details': False}
+        if is_stream:
+            source.seek(0)
+            try:
+                tags = exifread.process_file(source, **exif_options)
+            finally:
+                source.seek(0)
+        else:
+            with open(source, 'rb') as img_file:
+                tags = exifread.process_file(img_file, **exif_options)
+        
+        logger.debug(f"exifread returned {len(tags)} tags")
+        
+        # Extraer información GPS
+        gps_latitude = tags.get("GPS GPSLatitude")
+        gps_latitude_ref = tags.get("GPS GPSLatitudeRef")
+        gps_longitude = tags.get("GPS GPSLongitude")
+        gps_longitude_ref = tags.get("GPS GPSLongitudeRef")
+        
+        logger.debug(f"exifread GPS: lat={gps_latitude is not None}, lat_ref={gps_latitude_ref is not None}, lon={gps_longitude is not None}, lon_ref={gps_longitude_ref is not None}")
+        
+        # Verificar si tenemos toda la información GPS necesaria
+        if gps_latitude and gps_latitude_ref and gps_longitude and gps_longitude_ref:
+            # Convertir coordenadas GPS a grados decimales
+            def convert_to_degrees(value):
+                """Convierte un valor de exifread (Ratio) a grados decimales"""
+                # exifread devuelve objetos Ratio con .values que es una lista de Ratio
+                # Cada Ratio tiene .num (numerador) y .den (denominador)
+                d = float(value.values[0].num) / float(value.values[0].den)  # Degrees
+                m = float(value.values[1].num) / float(value.values[1].den)  # Minutes
+                s = float(value.values[2].num) / float(value.values[2].den)  # Seconds
+                
+                # Calcular grados decimales
+                return d + (m / 60.0) + (s / 3600.0)
             
-            # Extraer información GPS
-            gps_latitude = tags.get("GPS GPSLatitude")
-            gps_latitude_ref = tags.get("GPS GPSLatitudeRef")
-            gps_longitude = tags.get("GPS GPSLongitude")
-            gps_longitude_ref = tags.get("GPS GPSLongitudeRef")
+            lat = convert_to_degrees(gps_latitude)
+            lon = convert_to_degrees(gps_longitude)
             
-            logger.debug(f"exifread GPS: lat={gps_latitude is not None}, lat_ref={gps_latitude_ref is not None}, lon={gps_longitude is not None}, lon_ref={gps_longitude_ref is not None}")
+            # Ajustar latitud y longitud según los valores de referencia
+            # exifread devuelve objetos Ratio, necesitamos acceder a .values[0]
+            if gps_latitude_ref.values[0] != 'N':
+                lat = -lat
+            if gps_longitude_ref.values[0] != 'E':
+                lon = -lon
             
-            # Verificar si tenemos toda la información GPS necesaria
-            if gps_latitude and gps_latitude_ref and gps_longitude and gps_longitude_ref:
-                # Convertir coordenadas GPS a grados decimales
-                def convert_to_degrees(value):
-                    """Convierte un valor de exifread (Ratio) a grados decimales"""
-                    # exifread devuelve objetos Ratio con .values que es una lista de Ratio
-                    # Cada Ratio tiene .num (numerador) y .den (denominador)
-                    d = float(value.values[0].num) / float(value.values[0].den)  # Degrees
-                    m = float(value.values[1].num) / float(value.values[1].den)  # Minutes
-                    s = float(value.values[2].num) / float(value.values[2].den)  # Seconds
-                    
-                    # Calcular grados decimales
-                    return d + (m / 60.0) + (s / 3600.0)
-                
-                lat = convert_to_degrees(gps_latitude)
-                lon = convert_to_degrees(gps_longitude)
-                
-                # Ajustar latitud y longitud según los valores de referencia
-                # exifread devuelve objetos Ratio, necesitamos acceder a .values[0]
-                if gps_latitude_ref.values[0] != 'N':
-                    lat = -lat
-                if gps_longitude_ref.values[0] != 'E':
-                    lon = -lon
-                
-                logger.info(f"✅ GPS extracted via exifread: ({lat:.6f}, {lon:.6f})")
-                return lat, lon
-            else:
-                # Log qué tags GPS están disponibles para debugging
-                gps_tags = {k: v for k, v in tags.items() if k.startswith('GPS')}
-                logger.debug(f"exifread: GPS data incomplete. Available GPS tags: {list(gps_tags.keys())}")
+            logger.info(f"✅ GPS extracted via exifread: ({lat:.6f}, {lon:.6f})")
+            return lat, lon
+        else:
+            # Log qué tags GPS están disponibles para debugging
+            gps_tags = {k: v for k, v in tags.items() if k.startswith('GPS')}
+            logger.debug(f"exifread: GPS data incomplete. Available GPS tags: {list(gps_tags.keys())}")
                 
     except ImportError:
         logger.debug("exifread not available, trying Pillow _getexif()")
@@ -214,13 +245,15 @@ def extract_gps_from_image(file_path):
         from PIL import Image
         from PIL.ExifTags import TAGS, GPSTAGS
         
-        image = Image.open(file_path)
-        logger.debug(f"Image opened: {path.name}, format={image.format}, size={image.size}")
+        if is_stream:
+            source.seek(0)
+        image = Image.open(source)
+        logger.debug(f"Image opened: {name}, format={image.format}, size={image.size}")
         
         # Verificar si hay datos EXIF
         exif_data = image._getexif()
         if exif_data is None:
-            logger.warning(f"❌ {path.name} contains no exif data")
+            logger.warning(f"❌ {name} contains no exif data")
             return None, None
         
         logger.debug(f"Pillow _getexif() returned {len(exif_data)} tags")
@@ -264,11 +297,14 @@ def extract_gps_from_image(file_path):
             return None, None
             
     except FileNotFoundError:
-        logger.error(f"File not found: {file_path}")
+        logger.error(f"File not found: {name}")
         return None, None
     except Exception as e:
-        logger.error(f"Error extracting GPS from {file_path}: {e}", exc_info=True)
+        logger.error(f"Error extracting GPS from {name}: {e}", exc_info=True)
         return None, None
+    finally:
+        if is_stream:
+            source.seek(0)
 
 def optimize_image(file_path):
     """Optimize uploaded images"""
@@ -508,11 +544,24 @@ def get_image_url(image_filename, size='large'):
             current_app.logger.error(f'❌ get_image_url: Both attempts failed: {e2}')
             return None
 
+# Cleaner de bleach reutilizado (bleach.clean crea uno nuevo en cada llamada).
+# Uno por hilo: el parser del Cleaner guarda estado y gunicorn corre con --threads
+_html_cleaner_local = threading.local()
+
+def _get_html_cleaner():
+    cleaner = getattr(_html_cleaner_local, 'cleaner', None)
+    if cleaner is None:
+        cleaner = bleach.sanitizer.Cleaner(
+            tags=['p', 'br', 'strong', 'em', 'u', 'a'],
+            attributes={'a': ['href', 'title']},
+            strip=True
+        )
+        _html_cleaner_local.cleaner = cleaner
+    return cleaner
+
 def sanitize_html(text):
     """Sanitize user input to prevent XSS"""
-    allowed_tags = ['p', 'br', 'strong', 'em', 'u', 'a']
-    allowed_attributes = {'a': ['href', 'title']}
-    return bleach.clean(text, tags=allowed_tags, attributes=allowed_attributes, strip=True)
+    return _get_html_cleaner().clean(text)
 
 def get_category_name(category_key):
     """Get translated category name"""
@@ -530,8 +579,30 @@ def get_category_name(category_key):
     }
     return category_names.get(category_key, category_key)
 
+def _context_memo(name):
+    """Dict stored in flask.g: memo that lives for the current request/app context only
+    (names depend on the locale and on admin-editable categories, so no longer cache)"""
+    from flask import g, has_app_context
+    if not has_app_context():
+        return None
+    memo = g.get(name)
+    if memo is None:
+        memo = {}
+        setattr(g, name, memo)
+    return memo
+
 def get_inventory_category_name(category, subcategory=None):
     """Get translated inventory category and subcategory names from BD (with fallback)"""
+    memo = _context_memo('_inventory_category_names')
+    if memo is None:
+        return _load_inventory_category_name(category, subcategory)
+    key = (category, subcategory)
+    if key not in memo:
+        memo[key] = _load_inventory_category_name(category, subcategory)
+    return memo[key]
+
+def _load_inventory_category_name(category, subcategory=None):
+    """Resolve the category name from BD (uncached)"""
     from flask_babel import gettext as _
     from flask import current_app
     from app.models import InventoryCategory
@@ -607,6 +678,15 @@ def _get_inventory_category_name_fallback(category, subcategory=None):
 
 def get_inventory_subcategory_name(subcategory):
     """Get translated subcategory name only from BD (with fallback)"""
+    memo = _context_memo('_inventory_subcategory_names')
+    if memo is None:
+        return _load_inventory_subcategory_name(subcategory)
+    if subcategory not in memo:
+        memo[subcategory] = _load_inventory_subcategory_name(subcategory)
+    return memo[subcategory]
+
+def _load_inventory_subcategory_name(subcategory):
+    """Resolve the subcategory name from BD (uncached)"""
     from flask_babel import gettext as _
     from flask import current_app
     from app.models import InventoryCategory
@@ -13,6 +13,11 @@ app = create_app()
 # Export at module level so 'celery -A celery_worker.celery' works
 celery = app.celery
 
+# Compilar las plantillas de email antes de que Celery cree los procesos del pool
+with app.app_context():
+    from app.services.email_service import warm_email_templates
+    warm_email_templates()
+
 if __name__ == '__main__':
     # Run worker
     celery.worker_main(['worker', '--loglevel=info'])
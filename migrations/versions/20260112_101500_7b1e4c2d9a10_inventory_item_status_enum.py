@@ -0,0 +1,46 @@
+"""Convert inventory_item.status to a native PostgreSQL enum
+
+Revision ID: 7b1e4c2d9a10
+Revises: 46a3cbac6d0c
+Create Date: 2026-01-12 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1e4c2d9a10'
+down_revision = '46a3cbac6d0c'
+branch_labels = None
+depends_on = None
+
+# Debe coincidir con InventoryItemStatus.all()
+STATUS_VALUES = ('pending', 'approved', 'rejected', 'resolved', 'removed')
+
+
+def upgrade():
+    inv_status = sa.Enum(*STATUS_VALUES, name='inv_status')
+    inv_status.create(op.get_bind(), checkfirst=True)
+
+    # Cualquier valor heredado fuera del enum (p.ej. el antiguo 'active') pasa a 'approved'
+    op.execute(
+        "UPDATE inventory_item SET status = 'approved' "
+        "WHERE status NOT IN ('pending', 'approved', 'rejected', 'resolved', 'removed')"
+    )
+    op.execute("ALTER TABLE inventory_item ALTER COLUMN status DROP DEFAULT")
+    op.execute(
+        "ALTER TABLE inventory_item ALTER COLUMN status TYPE inv_status "
+        "USING status::inv_status"
+    )
+    op.execute("ALTER TABLE inventory_item ALTER COLUMN status SET DEFAULT 'pending'")
+
+
+def downgrade():
+    op.execute("ALTER TABLE inventory_item ALTER COLUMN status DROP DEFAULT")
+    op.execute(
+        "ALTER TABLE inventory_item ALTER COLUMN status TYPE VARCHAR(20) "
+        "USING status::text"
+    )
+    op.execute("ALTER TABLE inventory_item ALTER COLUMN status SET DEFAULT 'pending'")
+    sa.Enum(name='inv_status').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,44 @@
+"""Make inventory_item importance_count/resolved_count NOT NULL DEFAULT 0
+
+Revision ID: 3f9a6c1e5b27
+Revises: 7b1e4c2d9a10
+Create Date: 2026-01-12 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c1e5b27'
+down_revision = '7b1e4c2d9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill único de filas antiguas (antes se hacía en cada visita al mapa)
+    op.execute("UPDATE inventory_item SET importance_count = 0 WHERE importance_count IS NULL")
+    op.execute("UPDATE inventory_item SET resolved_count = 0 WHERE resolved_count IS NULL")
+
+    with op.batch_alter_table('inventory_item', schema=None) as batch_op:
+        batch_op.alter_column('importance_count',
+               existing_type=sa.Integer(),
+               nullable=False,
+               server_default='0')
+        batch_op.alter_column('resolved_count',
+               existing_type=sa.Integer(),
+               nullable=False,
+               server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('inventory_item', schema=None) as batch_op:
+        batch_op.alter_column('resolved_count',
+               existing_type=sa.Integer(),
+               nullable=True,
+               server_default=None)
+        batch_op.alter_column('importance_count',
+               existing_type=sa.Integer(),
+               nullable=True,
+               server_default=None)
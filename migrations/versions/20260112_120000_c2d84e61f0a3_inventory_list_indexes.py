@@ -0,0 +1,40 @@
+"""Add composite indexes for inventory list queries
+
+Revision ID: c2d84e61f0a3
+Revises: 3f9a6c1e5b27
+Create Date: 2026-01-12 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d84e61f0a3'
+down_revision = '3f9a6c1e5b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los listados filtran por status IN (...) y ordenan por created_at DESC:
+    # con este índice el ORDER BY se resuelve con un index scan en lugar de un sort
+    op.create_index(
+        'ix_inventory_status_created',
+        'inventory_item',
+        ['status', sa.text('created_at DESC')],
+        unique=False
+    )
+    # Filtros por categoría/subcategoría (api_items, mapa): la PK (item_id, category_id)
+    # no sirve para buscar por category_id, así que se indexa en orden inverso
+    op.create_index(
+        'ix_inventory_item_categories_category_item',
+        'inventory_item_categories',
+        ['category_id', 'item_id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_inventory_item_categories_category_item', table_name='inventory_item_categories')
+    op.drop_index('ix_inventory_status_created', table_name='inventory_item')
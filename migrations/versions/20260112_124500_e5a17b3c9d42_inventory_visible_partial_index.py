@@ -0,0 +1,33 @@
+"""Add partial index on visible inventory items by created_at
+
+Revision ID: e5a17b3c9d42
+Revises: c2d84e61f0a3
+Create Date: 2026-01-12 12:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a17b3c9d42'
+down_revision = 'c2d84e61f0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Índice parcial con solo los items visibles (InventoryItemStatus.visible_statuses()):
+    # más pequeño que ix_inventory_status_created y sirve directamente
+    # "WHERE status IN ('approved') ORDER BY created_at DESC LIMIT n" (home, mapa)
+    op.create_index(
+        'ix_inventory_visible_created',
+        'inventory_item',
+        [sa.text('created_at DESC')],
+        unique=False,
+        postgresql_where=sa.text("status = 'approved'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_inventory_visible_created', table_name='inventory_item')
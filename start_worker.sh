@@ -35,5 +35,5 @@ python -c "from app import create_app; app = create_app(); print('✅ Flask app
 
 # Start Celery worker
 echo "✅ Starting Celery worker..."
-exec celery -A celery_worker.celery worker --loglevel=info --concurrency=2
+exec celery -A celery_worker.celery worker --loglevel=info --concurrency=2 -Q celery,email -Ofair
 